@@ -0,0 +1,143 @@
+'''
+Actor processes for actor/learner training
+
+Each actor plays a VecTetris of `envs_per_actor` games with the latest weights published by the learner,
+choosing placements e-greedily with a NumpyQModel of those weights, and streams its transitions
+back to the learner in chunks over a queue. Weights are shared through one flat shared-memory array so
+publishing them costs a single copy regardless of the number of actors.
+'''
+import multiprocessing as mp
+import queue
+
+import numpy as np
+
+from VecTetris import VecTetris
+from NumpyQModel import NumpyQModel
+
+# transitions an actor collects before sending them to the learner
+CHUNK_SIZE = 64
+
+class ActorPool:
+
+    def __init__(self, num_actors, envs_per_actor, width, height, weight_shapes, seed=None) -> None:
+        '''
+        `weight_shapes` are the shapes of the arrays returned by `model.get_weights()`
+        '''
+        # Actors only use NumPy, fork them before the learner touches TensorFlow
+        self._ctx = mp.get_context("fork")
+
+        self.weight_shapes = [tuple(shape) for shape in weight_shapes]
+        num_weights = sum(int(np.prod(shape)) for shape in self.weight_shapes)
+
+        self._weights = self._ctx.Array('f', num_weights, lock=False)
+        self._weights_lock = self._ctx.Lock()
+        self._weights_version = self._ctx.Value('l', 0, lock=False)
+        self._epsilon = self._ctx.Value('d', 1.0, lock=False)
+        self._stop = self._ctx.Event()
+        self._transitions = self._ctx.Queue(maxsize=num_actors * 16)
+
+        self._processes = [
+            self._ctx.Process(
+                target=_run_actor,
+                args=(
+                    actor_id, envs_per_actor, width, height, None if seed is None else seed + actor_id * envs_per_actor,
+                    self.weight_shapes, self._weights, self._weights_lock, self._weights_version, self._epsilon,
+                    self._stop, self._transitions,
+                ),
+                daemon=True,
+            )
+            for actor_id in range(num_actors)
+        ]
+
+    def start(self):
+        for process in self._processes:
+            process.start()
+
+    def publish(self, weights, epsilon):
+        '''
+        Make `weights` (as from `model.get_weights()`) and `epsilon` the ones used by all actors
+        '''
+        flat = np.frombuffer(self._weights, dtype=np.float32)
+        with self._weights_lock:
+            offset = 0
+            for weight in weights:
+                flat[offset:offset+weight.size] = weight.reshape(-1)
+                offset += weight.size
+            self._epsilon.value = epsilon
+            self._weights_version.value += 1
+
+    def collect(self, timeout=None):
+        '''
+        Returns every chunk of transitions sent since the last call as a list of
+        (states, next_states, rewards, dones, finished episodes). Waits up to `timeout` seconds
+        for the first chunk if none are ready, `timeout=None` doesn't wait
+        '''
+        chunks = []
+        try:
+            if timeout is not None:
+                chunks.append(self._transitions.get(timeout=timeout))
+            while True:
+                chunks.append(self._transitions.get_nowait())
+        except queue.Empty:
+            pass
+
+        return chunks
+
+    def stop(self):
+        self._stop.set()
+        # drain so actors blocked on a full queue can see the stop event
+        while any(process.is_alive() for process in self._processes):
+            self.collect(timeout=0.1)
+        for process in self._processes:
+            process.join()
+
+def _run_actor(actor_id, envs_per_actor, width, height, seed, weight_shapes, shared_weights, weights_lock, weights_version, shared_epsilon, stop, transitions):
+    env = VecTetris(envs_per_actor, width, height, seed)
+    rng = np.random.default_rng(seed)
+
+    flat_weights = np.frombuffer(shared_weights, dtype=np.float32)
+    model = None
+    version = 0
+    epsilon = 1.0
+
+    chunk = []
+    states = env.get_states()
+
+    while not stop.is_set():
+        if weights_version.value != version:
+            with weights_lock:
+                version = weights_version.value
+                epsilon = shared_epsilon.value
+                weights = []
+                offset = 0
+                for shape in weight_shapes:
+                    size = int(np.prod(shape))
+                    weights.append(flat_weights[offset:offset+size].reshape(shape).copy())
+                    offset += size
+                model = NumpyQModel(weights)
+
+        features, _ = env.afterstates()
+        num_actions = np.diff(env.offsets)
+
+        # Choose actions via e-greedy, play randomly until the learner publishes weights
+        action_indices = (rng.random(envs_per_actor) * num_actions).astype(np.int64)
+        if model is not None:
+            greedy = rng.random(envs_per_actor) >= epsilon
+            if greedy.any():
+                action_indices[greedy] = env.argmax_per_env(model(features))[greedy]
+
+        next_states = features[env.offsets[:-1] + action_indices].copy()
+        rewards, dones = env.step(action_indices)
+
+        chunk.append((states, next_states, rewards, dones))
+        states = env.get_states()
+
+        if len(chunk) * envs_per_actor >= CHUNK_SIZE:
+            transitions.put((
+                np.concatenate([transition[0] for transition in chunk]),
+                np.concatenate([transition[1] for transition in chunk]),
+                np.concatenate([transition[2] for transition in chunk]),
+                np.concatenate([transition[3] for transition in chunk]),
+                env.pop_finished(),
+            ))
+            chunk = []
@@ -0,0 +1,55 @@
+'''
+Compares steps per second of the list-of-lists and bitboard Tetris backends
+
+A step is one agent step as done in DQNAgent.py: get the current state, search all placements,
+compute the state after every placement and take a random one.
+'''
+import argparse
+import random
+import time
+
+from Tetris import Tetris
+from BitboardTetris import BitboardTetris
+from PieceGenerator import GENERATORS
+
+BACKENDS = {
+    "list": Tetris,
+    "bitboard": BitboardTetris,
+}
+
+def run(backend, width, height, steps, seed, generator="uniform"):
+    tetris = BACKENDS[backend](width, height, generator=generator)
+    policy = random.Random(seed)
+    # same seed for every game so both backends see the same pieces
+    tetris.reset_state(seed)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        tetris.get_state()
+        actions = tetris.get_actions()
+        for point, orientation in actions:
+            tetris.state_after_action(point, orientation)
+
+        point, orientation = policy.choice(actions)
+        _, done = tetris.take_action(point, orientation)
+        if done:
+            tetris.reset_state(seed)
+    elapsed = time.perf_counter() - start
+
+    return steps / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--height", type=int, default=18)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--generator", choices=list(GENERATORS), default="uniform", help="piece generator")
+    args = parser.parse_args()
+
+    results = {}
+    for backend in BACKENDS:
+        results[backend] = run(backend, args.width, args.height, args.steps, args.seed, args.generator)
+        print(f"{backend:>10}: {results[backend]:8.1f} steps/s")
+
+    print(f"bitboard speedup: {results['bitboard']/results['list']:.2f}x")
@@ -0,0 +1,227 @@
+'''
+Benchmark suite for the engine and agent hot paths
+
+Every benchmark runs on a fixed corpus of board positions taken from seeded games, for each backend
+and board size. It reports calls per second and the memory allocated per call, measured by tracemalloc
+as the peak traced memory of a call above the memory in use before it. Results can be saved to JSON and
+compared against a previous run to spot regressions between commits.
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from Tetris import Tetris
+from BitboardTetris import BitboardTetris
+from Renderer import Renderer
+
+BACKENDS = {
+    "list": Tetris,
+    "bitboard": BitboardTetris,
+}
+
+# moves after which an end-to-end episode is cut off
+MAX_EPISODE_MOVES = 500
+
+def make_corpus(width, height, count, seed):
+    '''
+    Snapshots of every third position of seeded games played with random placements
+    '''
+    tetris = BitboardTetris(width, height)
+    policy = random.Random(seed)
+    positions = []
+
+    game = 0
+    while len(positions) < count:
+        tetris.reset_state(seed + game)
+        game += 1
+
+        step = 0
+        while not tetris.terminal_state and len(positions) < count:
+            if step % 3 == 0:
+                positions.append(tetris.snapshot())
+            tetris.take_action(*policy.choice(tetris.get_actions()))
+            step += 1
+
+    return positions
+
+def lowest_placement(tetris):
+    # the heuristic of LowestPlacementSimulation.py
+    return min(tetris.get_actions(), key=lambda action: action[0].y)
+
+### Benchmarks
+# Each is a function (tetris, position) -> list of zero-argument calls to time, run right after the
+# engine was put in `position`. Work done to build the calls isn't timed
+
+def bench_get_actions(tetris, position):
+    return [tetris.get_actions]
+
+def bench_bfs(tetris, position):
+    def search():
+        tetris.full_search = True
+        tetris.get_actions()
+        tetris.full_search = False
+    return [search]
+
+def bench_state_after_action(tetris, position):
+    return [lambda point=point, orientation=orientation: tetris.state_after_action(point, orientation) for point, orientation in tetris.get_actions()]
+
+def bench_afterstates(tetris, position):
+    return [tetris.afterstates]
+
+def bench_get_state(tetris, position):
+    return [tetris.get_state]
+
+def bench_take_action(tetris, position):
+    point, orientation = tetris.get_actions()[0]
+    return [lambda: tetris.take_action(point, orientation)]
+
+def bench_clear_lines(tetris, position):
+    # fill the bottom 1 to 4 rows so there is something to clear
+    rows = 1 + position % 4
+    tetris._set_tiles([(x, y) for x in range(tetris.WIDTH) for y in range(rows)], 1)
+    tetris._reset_column_state()
+    return [tetris._clear_lines]
+
+def bench_render_frame(tetris, position):
+    renderer = _renderer(tetris)
+    return [lambda: renderer.draw(tetris)]
+
+def bench_render_png(tetris, position):
+    path = os.path.join(tempfile.gettempdir(), "benchmark-render.png")
+    return [lambda: tetris.render(img_location=path)]
+
+def bench_episode(tetris, position):
+    def episode():
+        tetris.reset_state(position)
+        for _ in range(MAX_EPISODE_MOVES):
+            tetris.take_action(*lowest_placement(tetris))
+            if tetris.terminal_state:
+                break
+    return [episode]
+
+BENCHMARKS = {
+    "get_actions": bench_get_actions,
+    "bfs": bench_bfs,
+    "state_after_action": bench_state_after_action,
+    "afterstates": bench_afterstates,
+    "get_state": bench_get_state,
+    "take_action": bench_take_action,
+    "clear_lines": bench_clear_lines,
+    "render_frame": bench_render_frame,
+    "render_png": bench_render_png,
+    "episode": bench_episode,
+}
+
+# benchmarks too slow to run on every position of the corpus
+POSITION_LIMITS = {
+    "render_png": 20,
+    "episode": 5,
+}
+
+_renderers = {}
+
+def _renderer(tetris):
+    key = (tetris.WIDTH, tetris.HEIGHT)
+    if key not in _renderers:
+        _renderers[key] = Renderer(*key)
+    return _renderers[key]
+
+def run_benchmark(name, backend, corpus, width, height, repeat):
+    tetris = BACKENDS[backend](width, height)
+    benchmark = BENCHMARKS[name]
+    positions = corpus[:POSITION_LIMITS.get(name, len(corpus))]
+
+    # timing, best of `repeat` passes over the corpus
+    best = None
+    calls = 0
+    for _ in range(repeat):
+        elapsed = 0
+        calls = 0
+        for index, snapshot in enumerate(positions):
+            tetris.load_snapshot(snapshot)
+            for call in benchmark(tetris, index):
+                start = time.perf_counter()
+                call()
+                elapsed += time.perf_counter() - start
+                calls += 1
+        best = elapsed if best is None else min(best, elapsed)
+
+    # allocations, one traced pass
+    allocated = 0
+    tracemalloc.start()
+    for index, snapshot in enumerate(positions):
+        tetris.load_snapshot(snapshot)
+        for call in benchmark(tetris, index):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            call()
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    return {
+        "benchmark": name,
+        "backend": backend,
+        "width": width,
+        "height": height,
+        "calls": calls,
+        "seconds": best,
+        "ops_per_sec": calls / best if best > 0 else 0.0,
+        "alloc_bytes_per_call": allocated / calls if calls else 0.0,
+    }
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _result_key(result):
+    return result["benchmark"], result["backend"], result["width"], result["height"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10x18,6x12,20x36", help="comma separated WIDTHxHEIGHT board sizes")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma separated backends")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help="comma separated benchmarks")
+    parser.add_argument("--positions", type=int, default=100, help="positions in the corpus of each board size")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the corpus, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run to compare against")
+    args = parser.parse_args()
+
+    sizes = [tuple(int(n) for n in size.split("x")) for size in args.sizes.split(",")]
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {_result_key(result): result for result in json.load(f)["results"]}
+
+    results = []
+    for width, height in sizes:
+        corpus = make_corpus(width, height, args.positions, args.seed)
+        for name in args.benchmarks.split(","):
+            for backend in args.backends.split(","):
+                result = run_benchmark(name, backend, corpus, width, height, args.repeat)
+                results.append(result)
+
+                line = f"{width:>3}x{height:<3} {name:>18} {backend:>9}: {result['ops_per_sec']:12.1f} ops/s {result['alloc_bytes_per_call']:10.0f} B/call"
+                previous = baseline.get(_result_key(result))
+                if previous is not None and previous["ops_per_sec"] > 0:
+                    line += f"  {result['ops_per_sec'] / previous['ops_per_sec']:5.2f}x vs baseline"
+                print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "settings": vars(args),
+                "results": results,
+            }, f, indent=2)
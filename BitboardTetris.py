@@ -0,0 +1,174 @@
+import numpy as np
+
+from Point import Point
+import Tetromino
+from Tetris import Tetris
+
+class BitboardTetris(Tetris):
+    '''
+    Tetris engine storing the board as one integer bitmask per row
+
+    Bit x of `self.rows[y]` is set if the tile at (x, y) is filled. Collision checks, line clears
+    and feature extraction are shift/AND/popcount operations instead of per-cell loops.
+    `self.board` is still available as a list-of-lists view for rendering
+    '''
+
+    def __init__(self, width, height, seed=None, full_search=False, cache=None, preview_size=1, record=False, generator="uniform") -> None:
+        self.FULL_ROW = (1 << width) - 1
+        super().__init__(width, height, seed, full_search, cache, preview_size, record, generator)
+
+    @property
+    def board(self):
+        return [[(row >> x) & 1 for row in self.rows] for x in range(self.WIDTH)]
+
+    @board.setter
+    def board(self, board):
+        self.rows = [0 for _ in range(self.HEIGHT)]
+        for x, col in enumerate(board):
+            for y, tile in enumerate(col):
+                if tile != 0:
+                    self.rows[y] |= 1 << x
+
+    def board_array(self):
+        return ((np.array(self.rows, dtype=np.int64)[:, None] >> np.arange(self.WIDTH)) & 1).astype(np.int8)
+
+    def get_state_copy(self):
+        return self.rows.copy()
+
+    def _set_rows(self, rows):
+        self.rows = list(rows)
+
+    def _reset_column_state(self):
+        rows = self.rows
+        self._column_heights = [0 if top is None else top + 1 for top in self._calc_column_tops(rows)]
+        self._column_filled = [sum((row >> x) & 1 for row in rows) for x in range(self.WIDTH)]
+        self._row_filled = [row.bit_count() for row in rows]
+        self._row_zobrist = [self._hash_row(y) for y in range(self.HEIGHT)]
+        self._refresh_feature_totals()
+
+    def _row_mask(self, y):
+        return self.rows[y]
+
+    def _calc_num_holes(self, board=None):
+        if board is None:
+            board = self.rows
+
+        holes = 0
+        covered = 0
+
+        # walk down from the top, every empty tile under a covered column is a hole
+        for y in range(self.HEIGHT-1, -1, -1):
+            holes += (covered & ~board[y]).bit_count()
+            covered |= board[y]
+
+        return holes
+
+    def _calc_bumpiness(self, board=None):
+        if board is None:
+            board = self.rows
+
+        col_heights = self._calc_column_tops(board)
+
+        # mirrors Tetris._calc_bumpiness, including skipping columns whose top is at y == 0
+        prev_col_height = None
+        bumpiness = 0
+
+        for height in col_heights:
+            if height is not None and prev_col_height:
+                bumpiness += abs(prev_col_height - height)
+            prev_col_height = height
+
+        return bumpiness
+
+    def _calc_column_tops(self, board):
+        '''
+        Returns the y of the highest filled tile of each column, `None` for empty columns
+        '''
+        col_tops = [None] * self.WIDTH
+        seen = 0
+
+        for y in range(self.HEIGHT-1, -1, -1):
+            new = board[y] & ~seen
+            seen |= new
+            while new:
+                lowest = new & -new
+                col_tops[lowest.bit_length()-1] = y
+                new ^= lowest
+
+            if seen == self.FULL_ROW:
+                break
+
+        return col_tops
+
+    def _clear_lines(self, board = None, cleared_rows = None) -> None:
+        tracked = board is None
+        if tracked:
+            board = self.rows
+
+        remaining = [row for row in board if row != self.FULL_ROW]
+        cleared = len(board) - len(remaining)
+        if cleared:
+            filled_rows = [y for y, row in enumerate(board) if row == self.FULL_ROW]
+            if cleared_rows is not None:
+                cleared_rows.extend((y, self.FULL_ROW) for y in reversed(filled_rows))
+
+            board[:] = remaining + [0] * cleared
+            if tracked:
+                self._track_clear(filled_rows, board)
+
+        # Return number of lines cleared
+        return cleared
+
+    def _restore_lines(self, cleared_rows):
+        rows = self.rows
+        for y, row in reversed(cleared_rows):
+            rows.pop()
+            rows.insert(y, row)
+
+    def _set_tiles(self, cells, value):
+        rows = self.rows
+        for x, y in cells:
+            if value:
+                rows[y] |= 1 << x
+            else:
+                rows[y] &= ~(1 << x)
+
+    def _place_tetronimo(self, tetromino: Tetromino.RotatedTetromino, point: Point, COLOR=None, board=None):
+        tracked = board is None
+        if tracked:
+            board = self.rows
+
+        shift = point.x + tetromino['bounds'][0]
+        for dy, mask in tetromino['row_masks']:
+            board[point.y + dy] |= mask << shift
+
+        self.latest_placement = [(point.x + dx, point.y + dy) for dx, dy in tetromino['offsets']]
+
+        if tracked:
+            self._track_placement(self.latest_placement)
+
+        return point.y + tetromino['bounds'][3]
+
+    def _remove_tetronimo(self, tetromino: Tetromino.RotatedTetromino, point: Point, board=None):
+        tracked = board is None
+        if tracked:
+            board = self.rows
+
+        shift = point.x + tetromino['bounds'][0]
+        for dy, mask in tetromino['row_masks']:
+            board[point.y + dy] &= ~(mask << shift)
+
+        if tracked:
+            self._reset_column_state()
+
+    def _fits(self, tetromino: Tetromino.RotatedTetromino, x: int, y: int):
+        min_x, max_x, min_y, max_y = tetromino['bounds']
+        if x + min_x < 0 or x + max_x >= self.WIDTH or y + min_y < 0 or y + max_y >= self.HEIGHT:
+            return False
+
+        shift = x + min_x
+        rows = self.rows
+        for dy, mask in tetromino['row_masks']:
+            if rows[y + dy] & (mask << shift):
+                return False
+        return True
@@ -0,0 +1,145 @@
+'''
+Training checkpoints written on a background thread
+
+A checkpoint is a dict captured on the training thread: lists of arrays (model, target model and
+optimizer weights), dicts mixing arrays and plain values (the replay memory from `ReplayMemory.getstate()`)
+and any other picklable values (counters, schedules, RNG states). It is written as one directory,
+`ckpt-<step>`, holding an uncompressed `<key>.npz` for every list or dict with arrays and `state.pkl` for
+everything else, so loading it back is a few large reads. Weight lists use the `arr_<i>` layout of
+`NumpyQModel.export_npz`, so `ckpt-<step>/model.npz` can be loaded by `NumpyQModel` directly.
+
+A checkpoint is written to `ckpt-<step>.tmp` and renamed once complete, then `LATEST` is pointed at it,
+so a crash while writing leaves the previous checkpoint as the latest.
+'''
+import os
+import pickle
+import queue
+import shutil
+import threading
+
+import numpy as np
+
+LATEST = "LATEST"
+
+class Checkpointer:
+    '''
+    Writes checkpoints to `directory` on a background thread, keeping the last `keep` of them
+
+    `save` only queues the captured dict, the caller must hand over copies (e.g. `model.get_weights()`)
+    that training will not modify. One checkpoint is queued at a time, `save` blocks while a previous
+    one is still waiting to be written
+    '''
+
+    def __init__(self, directory, keep=2) -> None:
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+        self._checkpoints = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def save(self, step, checkpoint):
+        if self._error is not None:
+            raise self._error
+        self._checkpoints.put((step, checkpoint))
+
+    def close(self):
+        '''
+        Wait for the queued checkpoint to be written
+        '''
+        if self._thread.is_alive():
+            self._checkpoints.put(None)
+            self._thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            item = self._checkpoints.get()
+            if item is None:
+                return
+
+            # keep draining after an error so save() never blocks on a dead thread
+            if self._error is not None:
+                continue
+
+            try:
+                self._write(*item)
+            except Exception as error:
+                self._error = error
+
+    def _write(self, step, checkpoint):
+        name = f"ckpt-{step:010d}"
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        state = {}
+        for key, value in checkpoint.items():
+            if isinstance(value, list) and all(isinstance(item, np.ndarray) for item in value):
+                np.savez(os.path.join(tmp_path, f"{key}.npz"), *value)
+            elif isinstance(value, dict):
+                arrays = {field: item for field, item in value.items() if isinstance(item, np.ndarray)}
+                if arrays:
+                    np.savez(os.path.join(tmp_path, f"{key}.npz"), **arrays)
+                state[key] = {field: item for field, item in value.items() if field not in arrays}
+            else:
+                state[key] = value
+
+        with open(os.path.join(tmp_path, "state.pkl"), "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(tmp_path, path)
+
+        latest_tmp = os.path.join(self.directory, f"{LATEST}.tmp")
+        with open(latest_tmp, "w") as f:
+            f.write(name)
+        os.replace(latest_tmp, os.path.join(self.directory, LATEST))
+
+        self._prune()
+
+    def _prune(self):
+        names = sorted(name for name in os.listdir(self.directory) if name.startswith("ckpt-") and not name.endswith(".tmp"))
+        for name in names[:-self.keep]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+def latest_checkpoint(directory):
+    '''
+    Returns the path of the latest complete checkpoint in `directory`, or None if there is none
+    '''
+    try:
+        with open(os.path.join(directory, LATEST)) as f:
+            return os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+def load_checkpoint(path):
+    '''
+    Returns the checkpoint dict written to `path`, with the same keys and values it was saved with
+    '''
+    with open(os.path.join(path, "state.pkl"), "rb") as f:
+        checkpoint = pickle.load(f)
+
+    for file_name in os.listdir(path):
+        if not file_name.endswith(".npz"):
+            continue
+
+        key = file_name[:-len(".npz")]
+        with np.load(os.path.join(path, file_name)) as data:
+            if key in checkpoint:
+                checkpoint[key] = {**checkpoint[key], **{field: data[field] for field in data.files}}
+            else:
+                checkpoint[key] = [data[f"arr_{i}"] for i in range(len(data.files))]
+
+    return checkpoint
@@ -1,4 +1,5 @@
 import os; os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+import argparse
 import random
 from tqdm import tqdm
 import time
@@ -8,155 +9,521 @@ import tensorflow as tf
 import numpy as np
 
 import Tetris
+from ReplayMemory import ReplayMemory, PrioritizedReplayMemory
+from NumpyQModel import export_npz
+from Metrics import Metrics, MetricsWriter, clock
+from Checkpoint import Checkpointer, latest_checkpoint, load_checkpoint
 
-## Memory Leak experimental fix:
-config = tf.ConfigProto()
-config.gpu_options.per_process_gpu_memory_fraction = 0.9 # fraction of memory
-config.gpu_options.visible_device_list = "0"
-tf.keras.backend.tensorflow_backendset_session(tf.Session(config=config))
+## Memory Leak experimental fix: allocate GPU memory as needed instead of reserving it all up front
+for gpu in tf.config.list_physical_devices('GPU'):
+    tf.config.experimental.set_memory_growth(gpu, True)
 
 ### Environment
 WIDTH = 10
 HEIGHT = 18
-tetris = Tetris.Tetris(WIDTH, HEIGHT)
 
 ### Training Hyperparameters
 discount = 0.99
-epsilon = 1
+epsilon_max = 1
 epsilon_min = 0.1
-epsilon_interval = epsilon - epsilon_min
+epsilon_interval = epsilon_max - epsilon_min
 epsilon_decay_steps = 1000
 max_episodes = 2000
 max_steps_per_episode = 10000
 random_play_steps = 2000
 batch_size = 512
-epochs = 1
+target_sync_steps = 500 # learner steps between copying the model weights to the target network
 max_memory_length = 300000
 
-## Model
-input_size = 4 #WIDTH * HEIGHT
-model = tf.keras.Sequential()
-model.add(tf.keras.layers.Input(shape=(input_size)))
-model.add(tf.keras.layers.Dense(32, activation='relu'))
-model.add(tf.keras.layers.Dense(32, activation='relu'))
-model.add(tf.keras.layers.Dense(1, activation="linear"))
-model.compile(optimizer='adam', loss='mse')
-
-memory = []
-episode_reward_history = []
-average_reward = 0
-total_episodes = 0
-total_steps = 0
-
-f = open("stats.txt", "w")
-f.write("data\n")
-f.close()
-
-start = time.time()
-
-with tqdm(total=100, desc='cpu%', position=1) as cpubar, tqdm(total=100, desc='ram%', position=0) as rambar, tqdm(total=2000, desc="episode#", position=2) as episode_number:
-    while(True):
-        # ram usage diagnostics
-        rambar.n=psutil.virtual_memory().percent
-        cpubar.n=psutil.cpu_percent()
-        rambar.refresh()
-        cpubar.refresh()
-        episode_number.n = total_episodes
-        episode_number.refresh()
-
-        episode_reward = 0
-        tetris.reset_state()
-        try:
-            for step in range(1, max_steps_per_episode):
-                total_steps += 1
+### Actor/learner mode
+envs_per_actor = 8
+sync_weights_steps = 20 # learner steps between publishing weights to the actors
 
-                current_state = tetris.get_state()
-                possible_actions = tetris.get_actions()
+### Instrumentation (--metrics)
+metrics_flush_steps = 100 # steps between rows of phase timings written to the metrics file
 
-                # Choose action via e-greedy
-                if total_steps < random_play_steps or np.random.rand(1)[0] < epsilon:
-                    action = random.choice(possible_actions)
-                    next_state = tetris.state_after_action(action[0], action[1])
-                else:
-                    # Predict q-value for each possible action and choose the action that leads to highest q-value
+### Checkpoints (--checkpoint-dir, --resume)
+checkpoint_steps = 20000 # environment steps between checkpoints
+checkpoints_kept = 2
 
-                    next_states = np.array(list(map(lambda action: tetris.state_after_action(action[0], action[1]), possible_actions)))
+## Model
+input_size = 4 #WIDTH * HEIGHT
+layer_sizes = [input_size, 32, 32, 1]
+
+# "board" observation mode: the whole board after a placement, see Tetris.board_afterstates()
+board_shape = (HEIGHT, WIDTH, 1)
+conv_filters = [16, 32]
+conv_dense_units = 64
+
+def build_model(observation="features"):
+    model = tf.keras.Sequential()
+    if observation == "board":
+        model.add(tf.keras.layers.Input(shape=board_shape))
+        for filters in conv_filters:
+            model.add(tf.keras.layers.Conv2D(filters, 3, padding='same', activation='relu'))
+        model.add(tf.keras.layers.Flatten())
+        model.add(tf.keras.layers.Dense(conv_dense_units, activation='relu'))
+        model.add(tf.keras.layers.Dense(1, activation="linear"))
+    else:
+        model.add(tf.keras.layers.Input(shape=(input_size,)))
+        for units in layer_sizes[1:-1]:
+            model.add(tf.keras.layers.Dense(units, activation='relu'))
+        model.add(tf.keras.layers.Dense(layer_sizes[-1], activation="linear"))
+    model.compile(optimizer='adam', loss='mse')
+    return model
+
+def model_weight_shapes():
+    '''
+    Shapes of `build_model().get_weights()`, without building the model
+    '''
+    shapes = []
+    for units_in, units_out in zip(layer_sizes[:-1], layer_sizes[1:]):
+        shapes += [(units_in, units_out), (units_out,)]
+    return shapes
+
+def make_memory(replay="uniform", replay_path=None, observation="features"):
+    memory_class = PrioritizedReplayMemory if replay == "prioritized" else ReplayMemory
+    if observation == "board":
+        # boards are stored one bit per tile
+        return memory_class(max_memory_length, board_shape, path=replay_path, packed=True)
+    return memory_class(max_memory_length, (input_size,), path=replay_path)
+
+def build_target_model(model):
+    '''
+    Copy of `model` that the TD targets bootstrap from, synced every `target_sync_steps` learner steps
+    '''
+    target_model = tf.keras.models.clone_model(model)
+    target_model.set_weights(model.get_weights())
+    return target_model
+
+def make_train_step(model, target_model):
+    '''
+    Compiles one learner step: TD targets `r + discount * (1 - done) * Q_target(s')` and a weighted
+    MSE gradient step on `model`, in a single graph. Returns the TD errors of the batch
+    '''
+    @tf.function
+    def train_step(states, next_states, rewards, dones, weights):
+        # board observations are sampled as uint8
+        states = tf.cast(states, tf.float32)
+        next_states = tf.cast(next_states, tf.float32)
+
+        future_rewards = tf.squeeze(target_model(next_states, training=False), axis=1)
+        computed_q_values = rewards + discount * (1.0 - dones) * future_rewards
+
+        with tf.GradientTape() as tape:
+            q_values = tf.squeeze(model(states, training=True), axis=1)
+            td_errors = computed_q_values - q_values
+            loss = tf.reduce_mean(weights * tf.square(td_errors))
+
+        gradients = tape.gradient(loss, model.trainable_variables)
+        model.optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+
+        return td_errors
+
+    return train_step
+
+def fit_batch(train_step, memory, metrics=None):
+    '''
+    One learner step on a batch sampled from `memory`
+
+    With prioritized replay the loss is weighted by the importance-sampling weights and the TD errors
+    of the batch become the new priorities of its transitions
+    '''
+    if metrics is not None:
+        start = clock()
+
+    if isinstance(memory, PrioritizedReplayMemory):
+        states, next_states, rewards, dones, indices, weights = memory.sample(batch_size)
+    else:
+        states, next_states, rewards, dones = memory.sample(batch_size)
+        indices, weights = None, np.ones(batch_size, dtype=np.float32)
+
+    if metrics is not None:
+        metrics.add_time("replay_sample", start)
+        start = clock()
+
+    td_errors = train_step(states, next_states, rewards, dones.astype(np.float32), weights)
+
+    if indices is not None:
+        memory.update_priorities(indices, td_errors.numpy())
+
+    if metrics is not None:
+        metrics.add_time("fit", start)
+
+def save_model(model, observation="features"):
+    path = f'modeldata/{time.strftime("%Y%m%d-%H%M%S")}'
+    os.makedirs("modeldata", exist_ok=True)
+    # weights for NumpyQModel first, so simulations don't need TensorFlow (or the Keras save to succeed),
+    # it only runs the features MLP
+    if observation == "features":
+        export_npz(model, f"{path}.npz")
+    model.save(f"{path}.keras")
+
+def optimizer_weights(model):
+    optimizer = model.optimizer
+    # the slots are only created by the first gradient step, build them so a fresh run has some to save
+    if not optimizer.built:
+        optimizer.build(model.trainable_variables)
+    return [np.array(variable) for variable in optimizer.variables]
+
+def set_optimizer_weights(model, weights):
+    optimizer = model.optimizer
+    if not optimizer.built:
+        optimizer.build(model.trainable_variables)
+    for variable, weight in zip(optimizer.variables, weights):
+        variable.assign(weight)
+
+def capture_checkpoint(model, target_model, memory, training, tetris=None):
+    '''
+    Copies everything needed to resume a run into a dict for `Checkpointer.save`: the weights of both
+    networks and the optimizer, the replay memory, the `training` counters and schedule, and the RNGs
+    '''
+    return {
+        "model": model.get_weights(),
+        "target_model": target_model.get_weights(),
+        "optimizer": optimizer_weights(model),
+        "replay": memory.getstate(),
+        "training": training,
+        "rng": {
+            "random": random.getstate(),
+            "numpy": np.random.get_state(),
+            "episode_seeds": None if tetris is None else tetris._episode_seeds.getstate(),
+        },
+    }
+
+def restore_checkpoint(checkpoint, model, target_model, memory, tetris=None):
+    '''
+    Loads a dict from `capture_checkpoint` back into the networks, memory and RNGs, returns its `training`
+    '''
+    model.set_weights(checkpoint["model"])
+    target_model.set_weights(checkpoint["target_model"])
+    set_optimizer_weights(model, checkpoint["optimizer"])
+    memory.setstate(checkpoint["replay"])
+
+    rng = checkpoint["rng"]
+    random.setstate(rng["random"])
+    np.random.set_state(rng["numpy"])
+    if tetris is not None and rng["episode_seeds"] is not None:
+        tetris._episode_seeds.setstate(rng["episode_seeds"])
+
+    return checkpoint["training"]
+
+def resume_training(checkpoint_dir, resume, model, target_model, memory, tetris=None):
+    '''
+    Returns the training counters and schedule of the run as saved in checkpoints. With `resume` they are
+    restored, with the networks, memory and RNGs, from the latest checkpoint in `checkpoint_dir`,
+    otherwise they start from scratch and so does stats.txt
+    '''
+    if not resume:
+        f = open("stats.txt", "w")
+        f.write("data\n")
+        f.close()
+        return {"epsilon": epsilon_max, "episodes": 0, "steps": 0, "learner_steps": 0, "reward_history": [], "elapsed": 0}
+
+    path = latest_checkpoint(checkpoint_dir)
+    training = restore_checkpoint(load_checkpoint(path), model, target_model, memory, tetris)
+    print(f"Resumed from {path} at {training['steps']} steps, {training['episodes']} episodes, epsilon {training['epsilon']:.3f}")
+    return training
+
+def make_checkpoint_fn(checkpoint_dir, model, target_model, memory, tetris=None):
+    '''
+    Returns (checkpoint, checkpointer), `checkpoint(...)` queues a checkpoint of the run with the given
+    counters on `checkpointer`, which must be closed at the end of the run
+    '''
+    checkpointer = Checkpointer(checkpoint_dir, checkpoints_kept)
+
+    def checkpoint(epsilon, episodes, steps, learner_steps, reward_history, training_start):
+        training = {
+            "epsilon": epsilon, "episodes": episodes, "steps": steps, "learner_steps": learner_steps,
+            "reward_history": list(reward_history), "elapsed": time.time() - training_start,
+        }
+        checkpointer.save(steps, capture_checkpoint(model, target_model, memory, training, tetris))
+
+    return checkpoint, checkpointer
+
+def open_metrics(metrics_path, append=False):
+    '''
+    Returns (Metrics, MetricsWriter) writing to `metrics_path`, or (None, None) without one
+    '''
+    if metrics_path is None:
+        return None, None
+    return Metrics(), MetricsWriter(metrics_path, append=append)
+
+def train(replay="uniform", replay_path=None, observation="features", metrics_path=None, checkpoint_dir="checkpoints", resume=False):
+    tetris = Tetris.Tetris(WIDTH, HEIGHT)
+    metrics, metrics_writer = open_metrics(metrics_path, append=resume)
+    tetris.metrics = metrics
+    model = build_model(observation)
+    target_model = build_target_model(model)
+    train_step = make_train_step(model, target_model)
+
+    memory = make_memory(replay, replay_path, observation)
+
+    if observation == "board":
+        get_state, afterstates = tetris.board_state, tetris.board_afterstates
+    else:
+        get_state, afterstates = tetris.get_state, tetris.afterstates
+
+    training = resume_training(checkpoint_dir, resume, model, target_model, memory, tetris)
+    epsilon, total_episodes, total_steps, learner_steps, episode_reward_history = (
+        training["epsilon"], training["episodes"], training["steps"], training["learner_steps"], training["reward_history"]
+    )
+    average_reward = np.mean(episode_reward_history) if episode_reward_history else 0
+
+    checkpoint, checkpointer = make_checkpoint_fn(checkpoint_dir, model, target_model, memory, tetris)
+    next_checkpoint = total_steps + checkpoint_steps
+
+    start = time.time()
+    training_start = start - training["elapsed"]
+
+    with tqdm(total=100, desc='cpu%', position=1) as cpubar, tqdm(total=100, desc='ram%', position=0) as rambar, tqdm(total=2000, desc="episode#", position=2) as episode_number:
+        while(True):
+            # ram usage diagnostics
+            rambar.n=psutil.virtual_memory().percent
+            cpubar.n=psutil.cpu_percent()
+            rambar.refresh()
+            cpubar.refresh()
+            episode_number.n = total_episodes
+            episode_number.refresh()
+
+            episode_reward = 0
+            tetris.reset_state()
+            try:
+                for step in range(1, max_steps_per_episode):
+                    total_steps += 1
+                    if metrics is not None:
+                        step_start = clock()
+
+                    current_state = get_state()
+                    next_states, possible_actions = afterstates()
+
+                    # Choose action via e-greedy
+                    if total_steps < random_play_steps or np.random.rand(1)[0] < epsilon:
+                        best_action_index = random.randrange(len(possible_actions))
+                    else:
+                        # Predict q-value for each possible action and choose the action that leads to highest q-value
+                        if metrics is not None:
+                            start_inference = clock()
+
+                        estimated_q_values = model.predict(next_states, verbose=0) ## TODO: replace with predict?
+
+                        best_action_index = tf.argmax(estimated_q_values).numpy()[0]
+
+                        if metrics is not None:
+                            metrics.add_time("inference", start_inference)
+
+                    # next_states is reused by the next afterstates() call
+                    next_state = next_states[best_action_index].copy()
+                    action = tetris.decode_action(possible_actions[best_action_index])
+
+                    # take action chosen in environment
+                    reward, done = tetris.take_action(action[0], action[1])
+                    # tetris.render()
+
+                    episode_reward += reward
+
+                    # Save actions and states in replay buffer
+                    memory.append(current_state, next_state, reward, done)
+
+                    if total_steps > random_play_steps and len(memory) > batch_size:
+                        fit_batch(train_step, memory, metrics)
+                        learner_steps += 1
+
+                        if learner_steps % target_sync_steps == 0:
+                            target_model.set_weights(model.get_weights())
+
+                    if metrics is not None:
+                        metrics.add_time("step", step_start)
+                        if total_steps % metrics_flush_steps == 0:
+                            metrics_writer.write({"steps": total_steps, "episodes": total_episodes, "elapsed": time.time() - training_start, **metrics.flush()})
+
+                    if done:
+                        break
+
+                # update epsilon
+                epsilon = epsilon - (epsilon_interval/epsilon_decay_steps)
+                epsilon = max(epsilon, epsilon_min)
+
+                episode_reward_history.append(episode_reward)
+                if len(episode_reward_history) > 25:
+                    del episode_reward_history[:1]
+                average_reward = np.mean(episode_reward_history)
+
+                total_episodes += 1
+
+                if total_episodes % 1 == 0:
+                    end = time.time()
+
+                    f = open("stats.txt", "a")
+                    output = ""
+                    output += f"Average Reward: {average_reward:.2f}, Total Episodes: {total_episodes}, Time: {end-start}, epsilon: {epsilon}, Episode Steps: {step}, RAM: {cpubar.n}, Elapsed: {end-training_start:.1f}\n"
+                    f.write(output)
+                    f.close()
+
+                    start = end
+
+                # between episodes, so the only game state to keep is the episode seed RNG
+                if total_steps >= next_checkpoint:
+                    checkpoint(epsilon, total_episodes, total_steps, learner_steps, episode_reward_history, training_start)
+                    next_checkpoint = total_steps + checkpoint_steps
+
+            except KeyboardInterrupt:
+                # the unfinished episode is dropped, its transitions are already in the memory
+                checkpoint(epsilon, total_episodes, total_steps, learner_steps, episode_reward_history, training_start)
+                checkpointer.close()
+                memory.flush()
+                if metrics_writer is not None:
+                    metrics_writer.close()
+                print(f"memory buffer size: {len(memory)} ({memory.nbytes / 2**20:.1f} MiB)")
+
+                print("Keyboard Interrupt Detected. Stopping Training", end="\n\n")
+                print(f"Total Episodes: {total_episodes}, Total Steps: {total_steps}, Average Reward (last 100 Episodes): {average_reward:.2f}")
+                save_model(model, observation)
+                exit(0)
+
+def train_distributed(num_actors, replay="uniform", replay_path=None, metrics_path=None, checkpoint_dir="checkpoints", resume=False):
+    '''
+    Actor/learner training: `num_actors` processes play games with a periodically synced copy of the
+    weights (see ActorPool.py) while this process trains on the transitions they stream back
+    '''
+    from ActorPool import ActorPool
+
+    # fork the actors before TensorFlow does any work in this process
+    pool = ActorPool(num_actors, envs_per_actor, WIDTH, HEIGHT, model_weight_shapes())
+    pool.start()
+
+    model = build_model()
+    target_model = build_target_model(model)
+    train_step = make_train_step(model, target_model)
+    metrics, metrics_writer = open_metrics(metrics_path, append=resume)
 
-                    estimated_q_values = model.predict(next_states, verbose=0) ## TODO: replace with predict?
-            
-                    best_action_index = tf.argmax(estimated_q_values).numpy()[0]
+    memory = make_memory(replay, replay_path)
+
+    training = resume_training(checkpoint_dir, resume, model, target_model, memory)
+    epsilon, total_episodes, total_steps, learner_steps, episode_reward_history = (
+        training["epsilon"], training["episodes"], training["steps"], training["learner_steps"], training["reward_history"]
+    )
+    average_reward = np.mean(episode_reward_history) if episode_reward_history else 0
+    if resume:
+        # the actors' own games and RNGs aren't checkpointed, they start new games with the restored weights
+        pool.publish(model.get_weights(), epsilon)
+
+    checkpoint, checkpointer = make_checkpoint_fn(checkpoint_dir, model, target_model, memory)
+    next_checkpoint = total_steps + checkpoint_steps
+
+    start = time.time()
+    training_start = start - training["elapsed"]
+
+    with tqdm(total=100, desc='cpu%', position=1) as cpubar, tqdm(total=100, desc='ram%', position=0) as rambar, tqdm(total=2000, desc="episode#", position=2) as episode_number:
+        try:
+            while(True):
+                if metrics is not None:
+                    phase_start = clock()
 
-                    action = possible_actions[best_action_index]
-                    next_state = next_states[best_action_index]
+                chunks = pool.collect(timeout=None if total_steps > random_play_steps else 1.0)
 
-                # take action chosen in environment
-                reward, done = tetris.take_action(action[0], action[1])
-                # tetris.render()
+                if metrics is not None:
+                    metrics.add_time("collect", phase_start)
 
-                episode_reward += reward
+                for states, next_states, rewards, dones, finished in chunks:
+                    if metrics is not None:
+                        phase_start = clock()
 
-                # Save actions and states in replay buffer
-                memory.append((current_state, next_state, reward, done))
+                    memory.extend(states, next_states, rewards, dones)
+                    total_steps += len(rewards)
 
-                if total_steps > random_play_steps and len(memory) > batch_size:
+                    if metrics is not None:
+                        metrics.add_time("replay_extend", phase_start)
+                        metrics.count("transitions", len(rewards))
 
-                    batch = random.sample(memory, batch_size)
-                    
-                    next_states = np.array([experience[1] for experience in batch])
+                    for episode_reward, step, _ in finished:
+                        # update epsilon
+                        epsilon = epsilon - (epsilon_interval/epsilon_decay_steps)
+                        epsilon = max(epsilon, epsilon_min)
 
-                    future_rewards = model.predict(next_states, verbose=0)
+                        episode_reward_history.append(episode_reward)
+                        if len(episode_reward_history) > 25:
+                            del episode_reward_history[:1]
+                        average_reward = np.mean(episode_reward_history)
 
-                    states = []
-                    computed_q_values = []
+                        total_episodes += 1
 
-                    for i, (sample_state, _, sample_reward, sample_done) in enumerate(batch):
-                        if sample_done:
-                            q_value = sample_reward
-                        else:
-                            q_value = sample_reward + discount * future_rewards[i][0]
+                        end = time.time()
 
-                        states.append(sample_state)
-                        computed_q_values.append(q_value)
-                    
-                    states = np.array(states)
-                    computed_q_values = np.array(computed_q_values)
+                        f = open("stats.txt", "a")
+                        output = ""
+                        output += f"Average Reward: {average_reward:.2f}, Total Episodes: {total_episodes}, Time: {end-start}, epsilon: {epsilon}, Episode Steps: {step}, Total Steps: {total_steps}, Elapsed: {end-training_start:.1f}\n"
+                        f.write(output)
+                        f.close()
 
-                    model.fit(states, computed_q_values, batch_size=batch_size, epochs=epochs, verbose=0)
-                    # tf.keras.backend.clear_session()
+                        start = end
 
-                if len(memory) > max_memory_length:
-                    # remove oldest memory in the list
-                    del memory[:1]
+                if chunks:
+                    # ram usage diagnostics
+                    rambar.n=psutil.virtual_memory().percent
+                    cpubar.n=psutil.cpu_percent()
+                    rambar.refresh()
+                    cpubar.refresh()
+                    episode_number.n = total_episodes
+                    episode_number.refresh()
 
-                if done:
-                    break
+                if total_steps > random_play_steps and len(memory) > batch_size:
+                    fit_batch(train_step, memory, metrics)
+                    learner_steps += 1
 
-            # update epsilon
-            epsilon = epsilon - (epsilon_interval/epsilon_decay_steps)
-            epsilon = max(epsilon, epsilon_min)
+                    if learner_steps % target_sync_steps == 0:
+                        target_model.set_weights(model.get_weights())
 
-            episode_reward_history.append(episode_reward)
-            if len(episode_reward_history) > 25:
-                del episode_reward_history[:1]
-            average_reward = np.mean(episode_reward_history)
+                    if (learner_steps - 1) % sync_weights_steps == 0:
+                        if metrics is not None:
+                            phase_start = clock()
 
-            total_episodes += 1
+                        pool.publish(model.get_weights(), epsilon)
 
-            if total_episodes % 1 == 0:
-                end = time.time()
+                        if metrics is not None:
+                            metrics.add_time("publish", phase_start)
 
-                f = open("stats.txt", "a")
-                output = ""
-                output += f"Average Reward: {average_reward:.2f}, Total Episodes: {total_episodes}, Time: {end-start}, epsilon: {epsilon}, Episode Steps: {step}, RAM: {cpubar.n}\n"
-                f.write(output)
-                f.close()
+                    if metrics is not None and learner_steps % metrics_flush_steps == 0:
+                        metrics_writer.write({"steps": total_steps, "learner_steps": learner_steps, "episodes": total_episodes, "elapsed": time.time() - training_start, **metrics.flush()})
 
-                start = end
+                if total_steps >= next_checkpoint:
+                    checkpoint(epsilon, total_episodes, total_steps, learner_steps, episode_reward_history, training_start)
+                    next_checkpoint = total_steps + checkpoint_steps
 
         except KeyboardInterrupt:
-            print(f"memory buffer size: {len(memory)}")
+            pool.stop()
+
+            checkpoint(epsilon, total_episodes, total_steps, learner_steps, episode_reward_history, training_start)
+            checkpointer.close()
+
+            memory.flush()
+            if metrics_writer is not None:
+                metrics_writer.close()
+            print(f"memory buffer size: {len(memory)} ({memory.nbytes / 2**20:.1f} MiB)")
 
             print("Keyboard Interrupt Detected. Stopping Training", end="\n\n")
-            print(f"Total Episodes: {total_episodes}, Total Steps: {total_steps}, Average Reward (last 100 Episodes): {average_reward:.2f}")
-            model.save(f'modeldata/{time.strftime("%Y%m%d-%H%M%S")}')
-            exit(0)
\ No newline at end of file
+            print(f"Total Episodes: {total_episodes}, Total Steps: {total_steps}, Learner Steps: {learner_steps}, Average Reward (last 100 Episodes): {average_reward:.2f}")
+            save_model(model)
+            exit(0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--actors", type=int, default=0, help="number of actor processes, 0 trains in a single loop")
+    parser.add_argument("--replay", choices=["uniform", "prioritized"], default="uniform", help="replay memory sampling")
+    parser.add_argument("--replay-path", default=None, help="directory to memory-map the replay memory to, an existing memory there is reused")
+    parser.add_argument("--observation", choices=["features", "board"], default="features", help="model input: the 4 board features or the whole board to a conv network")
+    parser.add_argument("--metrics", default=None, help="write phase timings and counters to this .csv or .jsonl file")
+    parser.add_argument("--checkpoint-dir", default="checkpoints", help=f"directory to write a checkpoint to every {checkpoint_steps} steps and on interrupt")
+    parser.add_argument("--resume", action="store_true", help="continue the run from the latest checkpoint in --checkpoint-dir")
+    args = parser.parse_args()
+
+    if args.resume and latest_checkpoint(args.checkpoint_dir) is None:
+        parser.error(f"no checkpoint to resume from in {args.checkpoint_dir}")
+
+    if args.actors > 0:
+        # actors score placements with NumpyQModel, which only runs the features MLP
+        if args.observation != "features":
+            parser.error("--observation board is only supported without --actors")
+        train_distributed(args.actors, args.replay, args.replay_path, args.metrics, args.checkpoint_dir, args.resume)
+    else:
+        train(args.replay, args.replay_path, args.observation, args.metrics, args.checkpoint_dir, args.resume)
@@ -1,35 +1,38 @@
-import tensorflow as tf
 import Tetris
+from Renderer import AsyncRenderer
+from NumpyQModel import NumpyQModel
 import numpy as np
 
+# weights exported by NumpyQModel.py from the model of the same name, see NumpyQModel.py for SavedModel directories
 MODEL_NAME = "20221204-163738"
-model = tf.keras.models.load_model(f'modeldata/{MODEL_NAME}')
+model = NumpyQModel.load(f'modeldata/{MODEL_NAME}.npz')
 
 WIDTH = 10
 HEIGHT = 18
-tetris = Tetris.Tetris(WIDTH, HEIGHT)
+tetris = Tetris.Tetris(WIDTH, HEIGHT, record=True)
 
 step = 0
 while(step < 90):
     step = 0
     tetris.reset_state()
+    video = AsyncRenderer("simulation/simulation.mp4", WIDTH, HEIGHT)
     while(not tetris.terminal_state):
         step += 1
 
-        possible_actions = tetris.get_actions()
-
-        # get actions and transform for input into model
-        next_states = np.array(list(map(lambda action: tetris.state_after_action(action[0], action[1]), possible_actions)))
+        # get actions and their resulting states as input for the model
+        next_states, possible_actions = tetris.afterstates()
 
         # estimate q value of each action
-        estimated_q_values = model(next_states, training=False) ## TODO: replace with predict?
+        estimated_q_values = model(next_states)
 
         # pick best action
-        best_action_index = tf.argmax(estimated_q_values).numpy()[0]
-        action = possible_actions[best_action_index]
+        best_action_index = int(np.argmax(estimated_q_values))
+        action = tetris.decode_action(possible_actions[best_action_index])
         
         _, done = tetris.take_action(action[0], action[1])
 
-        tetris.render(img_location = f"simulation/{step}.png")
+        video.submit(tetris)
 
+    video.close()
+    tetris.trace.save("simulation/game.trace")
     print(f"Finished. Rendered {step} frames")
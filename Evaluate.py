@@ -0,0 +1,167 @@
+'''
+Plays seeded games of a policy over a process pool, without rendering, and reports how it did
+
+Game i is played with episode seed `seed + i` and every policy is deterministic, so the per-game results
+and the report (apart from timings) only depend on the seeds, not on the number of workers.
+'''
+import argparse
+import json
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from BitboardTetris import BitboardTetris
+from PieceGenerator import GENERATORS
+
+POLICIES = ["lowest", "dqn", "planner"]
+
+def make_policy(policy, model_path=None, depth=2, beam_width=8):
+    '''
+    Returns a function choosing the (point, orientation) to play on a Tetris engine
+    '''
+    if policy == "lowest":
+        # the heuristic of LowestPlacementSimulation.py
+        def choose(tetris):
+            return min(tetris.get_actions(), key=lambda action: action[0].y)
+        return choose
+
+    if policy == "dqn":
+        from NumpyQModel import NumpyQModel
+        model = NumpyQModel.load(model_path)
+
+        def choose(tetris):
+            features, actions = tetris.afterstates()
+            return tetris.decode_action(actions[int(np.argmax(model(features)))])
+        return choose
+
+    if policy == "planner":
+        from Planner import BeamPlanner, heuristic_scorer, model_scorer
+        scorer = heuristic_scorer
+        if model_path is not None:
+            from NumpyQModel import NumpyQModel
+            scorer = model_scorer(NumpyQModel.load(model_path))
+        # no time budget, the moves must not depend on the machine
+        planner = BeamPlanner(scorer, depth=depth, beam_width=beam_width)
+
+        def choose(tetris):
+            _, action = planner.choose(tetris)
+            return tetris.decode_action(action)
+        return choose
+
+    raise ValueError(f"unknown policy {policy}")
+
+def play_game(tetris, choose, seed, max_moves):
+    '''
+    Returns the result of one game of `choose` started from episode seed `seed`, cut off after `max_moves`
+    '''
+    start = time.perf_counter()
+    tetris.reset_state(seed)
+    score = 0
+
+    while not tetris.terminal_state and tetris.tiles_placed < max_moves:
+        reward, _ = tetris.take_action(*choose(tetris))
+        score += reward
+
+    return {
+        "seed": seed,
+        "lines": tetris.total_lines_cleared,
+        "pieces": tetris.tiles_placed,
+        "score": score,
+        "finished": tetris.terminal_state,
+        "seconds": time.perf_counter() - start,
+    }
+
+# state of a worker process, set up once by _init_worker
+_worker = {}
+
+def _init_worker(settings):
+    _worker["tetris"] = BitboardTetris(
+        settings["width"], settings["height"], preview_size=max(settings["depth"] - 1, 1), generator=settings["generator"]
+    )
+    _worker["choose"] = make_policy(settings["policy"], settings["model_path"], settings["depth"], settings["beam_width"])
+    _worker["max_moves"] = settings["max_moves"]
+
+def _play_seed(seed):
+    return play_game(_worker["tetris"], _worker["choose"], seed, _worker["max_moves"])
+
+def evaluate(settings, games, seed=0, workers=None):
+    '''
+    Plays games with seeds `seed` to `seed + games - 1` as described by `settings` (see the command line
+    arguments), on `workers` processes (0 plays them in this process). Returns the results by seed
+    '''
+    seeds = range(seed, seed + games)
+
+    if workers == 0:
+        _init_worker(settings)
+        return [_play_seed(game_seed) for game_seed in seeds]
+
+    workers = mp.cpu_count() if workers is None else workers
+    with mp.get_context("fork").Pool(workers, initializer=_init_worker, initargs=(settings,)) as pool:
+        # imap keeps the results in seed order whatever worker finished first
+        return list(pool.imap(_play_seed, seeds, chunksize=max(1, games // (8 * workers))))
+
+def summarize(results, seconds):
+    report = {"games": len(results), "finished": sum(result["finished"] for result in results)}
+
+    for metric in ("lines", "pieces", "score"):
+        values = np.array([result[metric] for result in results], dtype=np.float64)
+        report[metric] = {
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            **{f"p{q}": float(np.percentile(values, q)) for q in (10, 25, 50, 75, 90)},
+        }
+
+    moves = sum(result["pieces"] for result in results)
+    report["seconds"] = seconds
+    report["moves_per_sec"] = moves / seconds if seconds > 0 else 0.0
+    report["games_per_sec"] = len(results) / seconds if seconds > 0 else 0.0
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("policy", choices=POLICIES)
+    parser.add_argument("--model", default=None, help=".npz weights from NumpyQModel.py, required by dqn, optional scorer of planner")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the number of cores, 0 plays in this process")
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--height", type=int, default=18)
+    parser.add_argument("--generator", choices=list(GENERATORS), default="uniform")
+    parser.add_argument("--max-moves", type=int, default=5000, help="moves after which a game is cut off")
+    parser.add_argument("--depth", type=int, default=2, help="planner lookahead")
+    parser.add_argument("--beam-width", type=int, default=8, help="planner beam width")
+    parser.add_argument("--output", default=None, help="write the report and every game's result to this JSON file")
+    args = parser.parse_args()
+
+    if args.policy == "dqn" and args.model is None:
+        parser.error("the dqn policy needs --model")
+
+    settings = {
+        "policy": args.policy,
+        "model_path": args.model,
+        "width": args.width,
+        "height": args.height,
+        "generator": args.generator,
+        "max_moves": args.max_moves,
+        "depth": args.depth,
+        "beam_width": args.beam_width,
+    }
+
+    start = time.perf_counter()
+    results = evaluate(settings, args.games, args.seed, args.workers)
+    report = summarize(results, time.perf_counter() - start)
+
+    print(f"{report['games']} games of {args.policy} ({report['finished']} ended, the rest hit --max-moves) in {report['seconds']:.1f}s")
+    for metric in ("lines", "pieces", "score"):
+        stats = report[metric]
+        print(f"{metric:>7}: mean {stats['mean']:9.1f} std {stats['std']:9.1f} min {stats['min']:7.0f} "
+              f"p10 {stats['p10']:7.0f} p50 {stats['p50']:7.0f} p90 {stats['p90']:7.0f} max {stats['max']:7.0f}")
+    print(f"{report['moves_per_sec']:.0f} moves/s, {report['games_per_sec']:.2f} games/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": settings, "seed": args.seed, "report": report, "games": results}, f, indent=2)
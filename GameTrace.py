@@ -0,0 +1,79 @@
+'''
+Compact binary record of one game, enough to replay it exactly
+
+A trace holds the board size, the preview size, the piece generator and the episode seed of the game,
+then for every move the tile placed and where it went as (x, y, rotation). The pieces are also
+reproducible from the seed, they are stored so a replay can check it sees the same game. See Replay.py
+to rebuild frames from a trace
+'''
+import struct
+
+import Tetromino
+from PieceGenerator import GENERATORS
+
+MAGIC = b"TTRC"
+VERSION = 2
+
+# position of each piece generator's name in the header
+GENERATOR_IDS = {name: generator_id for generator_id, name in enumerate(GENERATORS)}
+GENERATOR_NAMES = list(GENERATORS)
+
+# magic, version, width, height, preview size, generator id, episode seed, number of moves
+_HEADER = struct.Struct("<4sBHHBBQI")
+# x, y, rotation of one move
+_MOVE = struct.Struct("<hhB")
+
+class GameTrace:
+
+    def __init__(self, width, height, preview_size, seed, generator="uniform") -> None:
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.preview_size = preview_size
+        self.seed = seed
+        self.generator = generator
+
+        # piece id of the tile placed by every move, and its packed (x, y, rotation)
+        self.pieces = bytearray()
+        self.moves = bytearray()
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def append(self, tile, x, y, rotation):
+        self.pieces.append(Tetromino.PIECE_IDS[tile])
+        self.moves += _MOVE.pack(x, y, rotation)
+
+    def move(self, index):
+        '''
+        Returns (tile, x, y, rotation) of move `index`
+        '''
+        x, y, rotation = _MOVE.unpack_from(self.moves, index * _MOVE.size)
+        return Tetromino.PIECES_NAMES[self.pieces[index]], x, y, rotation
+
+    def to_bytes(self):
+        header = _HEADER.pack(
+            MAGIC, VERSION, self.WIDTH, self.HEIGHT, self.preview_size, GENERATOR_IDS[self.generator], self.seed, len(self)
+        )
+        return header + bytes(self.pieces) + bytes(self.moves)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, width, height, preview_size, generator_id, seed, num_moves = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a version {VERSION} game trace")
+
+        trace = cls(width, height, preview_size, seed, GENERATOR_NAMES[generator_id])
+        pieces_start = _HEADER.size
+        moves_start = pieces_start + num_moves
+        trace.pieces = bytearray(data[pieces_start:moves_start])
+        trace.moves = bytearray(data[moves_start:moves_start + num_moves * _MOVE.size])
+        return trace
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
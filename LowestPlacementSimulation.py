@@ -1,7 +1,8 @@
-import time
 from Tetris import Tetris
+from Renderer import AsyncRenderer
 
-t = Tetris(10, 18)
+t = Tetris(10, 18, record=True)
+video = AsyncRenderer("simulation/simulation.mp4", 10, 18)
 
 step = 0
 while not t.terminal_state:
@@ -15,8 +16,8 @@ while not t.terminal_state:
 
     t.take_action(point, orientation)
 
-    t.render(img_location = f"simulation/{step}.png")
-
-    time.sleep(0.1)
+    video.submit(t)
 
+video.close()
+t.trace.save("simulation/game.trace")
 print(f"Finished. Rendered {step} frames")
\ No newline at end of file
@@ -0,0 +1,107 @@
+'''
+Opt-in timers and counters for the engine and training hot paths
+
+A `Metrics` accumulates the time spent in each named phase and named counts between flushes, code that
+supports it takes an optional `metrics` and does nothing extra when it is `None`. `flush()` turns the
+accumulators into one flat row for a `MetricsWriter`, which buffers rows and appends them to a CSV or
+JSON lines file.
+'''
+import csv
+import json
+from collections import defaultdict
+from time import perf_counter as clock
+
+class Metrics:
+
+    def __init__(self) -> None:
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    def add_time(self, name, start):
+        '''
+        Add the time since `start` (a `clock()` reading) to phase `name`
+        '''
+        self.seconds[name] += clock() - start
+        self.calls[name] += 1
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def flush(self):
+        '''
+        Returns the accumulated values as a row of `<phase>_ms`, `<phase>_calls` and counters, and resets them
+        '''
+        row = {}
+        for name, seconds in self.seconds.items():
+            row[f"{name}_ms"] = seconds * 1000
+            row[f"{name}_calls"] = self.calls[name]
+        row.update(self.counters)
+
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+        return row
+
+class MetricsWriter:
+    '''
+    Writes rows to `path`, as CSV if it ends in `.csv` and JSON lines otherwise, `flush_rows` rows at a time
+
+    A key first seen after the CSV header was written (a phase that only starts later in training) adds a
+    column, the file is then rewritten once with the wider header and the earlier rows left empty in it.
+    With `append=True` (a resumed run) rows are added after those already in the file, under its header
+    '''
+
+    def __init__(self, path, flush_rows=50, append=False) -> None:
+        self.path = path
+        self.flush_rows = flush_rows
+        self._csv = path.lower().endswith(".csv")
+        self._file = open(path, "a+" if append else "w+", newline="")
+        self._fields = []
+        self._rows = []
+
+        if self._csv and append:
+            self._file.seek(0)
+            self._fields = next(csv.reader(self._file), [])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+
+        if self._csv:
+            fields = list(dict.fromkeys([*self._fields, *(key for row in self._rows for key in row)]))
+            if len(fields) != len(self._fields):
+                self._rewrite(fields)
+            csv.DictWriter(self._file, self._fields).writerows(self._rows)
+        else:
+            self._file.write("".join(json.dumps(row) + "\n" for row in self._rows))
+
+        self._file.flush()
+        self._rows = []
+
+    def _rewrite(self, fields):
+        # read back the rows already written and write them again under the new header
+        self._file.seek(0)
+        rows = list(csv.DictReader(self._file)) if self._fields else []
+        self._file.seek(0)
+        self._file.truncate()
+
+        writer = csv.DictWriter(self._file, fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        self._fields = fields
+
+    def close(self):
+        self.flush()
+        self._file.close()
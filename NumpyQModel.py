@@ -0,0 +1,85 @@
+'''
+NumPy inference for the Q-models trained by DQNAgent.py, without TensorFlow
+
+`export_npz` dumps the weights of a trained Keras model to a small `.npz` file, `NumpyQModel` loads it
+and scores batches of afterstates with a forward pass of the Dense relu MLP built by
+`DQNAgent.build_model()`, writing every layer into buffers preallocated for the largest batch seen.
+
+Convert a saved model with `python NumpyQModel.py modeldata/<name>.keras`, which writes modeldata/<name>.npz.
+Keras 3 can't load the SavedModel directories (`modeldata/<name>`) saved before models were saved as
+.keras, re-export those by running this script on them with TensorFlow 2.15 or older (Keras 2)
+'''
+import argparse
+
+import numpy as np
+
+def export_npz(model, path):
+    '''
+    Write the weights of a Keras model from DQNAgent.build_model() to `path`
+    '''
+    np.savez(path, *[np.asarray(weight, dtype=np.float32) for weight in model.get_weights()])
+
+class NumpyQModel:
+
+    def __init__(self, weights) -> None:
+        '''
+        `weights` alternate kernel and bias of each Dense layer, as from `model.get_weights()`
+        '''
+        self.weights = [np.ascontiguousarray(weight, dtype=np.float32) for weight in weights]
+        for i, kernel in enumerate(self.weights[0::2]):
+            if kernel.ndim != 2:
+                raise ValueError(f"layer {i} has a kernel of shape {kernel.shape}, only the Dense MLP of the features "
+                                 f"observation (2-D kernels) can run on NumpyQModel")
+        self.kernels = self.weights[0::2]
+        self.biases = self.weights[1::2]
+
+        self._buffers = []
+        self._capacity = 0
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls([data[f"arr_{i}"] for i in range(len(data.files))])
+
+    def __call__(self, features, training=False):
+        '''
+        Returns the Q-value of every row of `features` as an array of shape (n,)
+
+        Takes `training` only so it can stand in for the Keras model in calls like `model(x, training=False)`
+        '''
+        features = np.asarray(features, dtype=np.float32)
+        n = len(features)
+        if n > self._capacity:
+            self._allocate(n)
+
+        x = features
+        last = len(self.kernels) - 1
+        for i, (kernel, bias) in enumerate(zip(self.kernels, self.biases)):
+            out = self._buffers[i][:n]
+            np.matmul(x, kernel, out=out)
+            out += bias
+            if i != last:
+                np.maximum(out, 0, out=out)
+            x = out
+
+        return x[:, 0].copy()
+
+    def _allocate(self, n):
+        # grow to the next power of two so batches of varying size rarely reallocate
+        self._capacity = 1 << (n - 1).bit_length()
+        self._buffers = [np.empty((self._capacity, kernel.shape[1]), dtype=np.float32) for kernel in self.kernels]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("model", help=".keras file written by DQNAgent.py (a SavedModel directory needs TensorFlow <= 2.15)")
+    parser.add_argument("--output", default=None, help="defaults to <model>.npz")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    name = args.model.rstrip('/')
+    model = tf.keras.models.load_model(name)
+    if name.endswith(".keras"):
+        name = name[:-len(".keras")]
+
+    export_npz(model, args.output or f"{name}.npz")
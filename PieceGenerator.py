@@ -0,0 +1,108 @@
+'''
+Seedable generators of the sequence of tiles a game is played with
+
+Each generator owns a `random.Random` seeded per episode and draws pieces `BLOCK_SIZE` at a time into
+a buffer, so taking the next piece is a list lookup rather than an RNG call. `getstate`/`setstate`
+capture the generator between any two pieces, e.g. for replay checkpoints.
+'''
+import abc
+import random
+
+import Tetromino
+
+# pieces drawn into the buffer at a time
+BLOCK_SIZE = 256
+
+class PieceGenerator(abc.ABC):
+
+    def __init__(self, seed=None) -> None:
+        self._random = random.Random(seed)
+        self._buffer = []
+        self._position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._position == len(self._buffer):
+            self._buffer = self._fill(BLOCK_SIZE)
+            self._position = 0
+
+        piece = self._buffer[self._position]
+        self._position += 1
+        return piece
+
+    def getstate(self):
+        return self._random.getstate(), tuple(self._buffer[self._position:])
+
+    def setstate(self, state):
+        random_state, buffer = state
+        self._random.setstate(random_state)
+        self._buffer = list(buffer)
+        self._position = 0
+
+    @abc.abstractmethod
+    def _fill(self, count):
+        '''
+        Returns the next `count` (or more) pieces of the sequence
+        '''
+
+class UniformGenerator(PieceGenerator):
+    '''
+    Every piece is drawn uniformly and independently
+    '''
+
+    def _fill(self, count):
+        return self._random.choices(Tetromino.PIECES_NAMES, k=count)
+
+class BagGenerator(PieceGenerator):
+    '''
+    7-bag randomizer: the pieces are dealt in bags holding one of each piece in shuffled order
+    '''
+
+    def _fill(self, count):
+        pieces = []
+        while len(pieces) < count:
+            bag = Tetromino.PIECES_NAMES.copy()
+            self._random.shuffle(bag)
+            pieces += bag
+        return pieces
+
+class NESGenerator(PieceGenerator):
+    '''
+    Generator of NES Tetris: roll one of the 7 pieces plus a dummy 8th value, and if that is the dummy
+    or repeats the previous piece roll once more among the 7 pieces
+    '''
+
+    def __init__(self, seed=None) -> None:
+        super().__init__(seed)
+        self._previous = None
+
+    def getstate(self):
+        return super().getstate(), self._previous
+
+    def setstate(self, state):
+        generator_state, self._previous = state
+        super().setstate(generator_state)
+
+    def _fill(self, count):
+        names = Tetromino.PIECES_NAMES
+        randrange = self._random.randrange
+        previous = self._previous
+
+        pieces = []
+        for _ in range(count):
+            roll = randrange(len(names) + 1)
+            if roll == len(names) or names[roll] == previous:
+                roll = randrange(len(names))
+            previous = names[roll]
+            pieces.append(previous)
+
+        self._previous = previous
+        return pieces
+
+GENERATORS = {
+    "uniform": UniformGenerator,
+    "7bag": BagGenerator,
+    "nes": NESGenerator,
+}
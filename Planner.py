@@ -0,0 +1,256 @@
+'''
+Lookahead placement search using the known upcoming tiles
+
+The planner expands every placement of the next tile, keeps the best `beam_width` of them, expands
+those with the first tile of the preview queue and so on, scoring each level of the tree in one batched
+call of a scorer. Nodes are placed and undone in place on the engine with push/pop_placement.
+
+RootParallelPlanner searches the subtree of every first placement on its own, spreading them over a
+pool of worker processes that receive the position as a compact bitboard snapshot.
+'''
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from BitboardTetris import BitboardTetris
+
+# weights of the classic (height, lines cleared, bumpiness, holes) evaluation
+HEURISTIC_WEIGHTS = np.array([-0.51, 0.76, -0.18, -0.36], dtype=np.float32)
+
+def heuristic_scorer(features):
+    return features @ HEURISTIC_WEIGHTS
+
+def model_scorer(model):
+    '''
+    Scorer from a Q-model returning one value per afterstate row, e.g. a Keras model from DQNAgent.py
+    '''
+    def score(features):
+        return np.asarray(model(features, training=False)).reshape(-1)
+    return score
+
+class BeamPlanner:
+
+    def __init__(self, scorer=heuristic_scorer, depth=2, beam_width=8, node_budget=None, time_budget=None) -> None:
+        '''
+        `depth` is the number of tiles to look at (1 is greedy), capped by the engine's `preview_size` + 1.
+        Expansion stops once `node_budget` nodes have been generated or `time_budget` seconds have passed,
+        the best move found so far is returned
+        '''
+        self.scorer = scorer
+        self.depth = depth
+        self.beam_width = beam_width
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+
+        # stats of the last call to choose(): nodes, seconds, nodes_per_sec, depth_reached, deadline_hit
+        self.last_stats = {}
+
+    def choose(self, tetris):
+        '''
+        Returns the index into `tetris.afterstates()` of the placement to take and the action row itself
+        '''
+        start = time.perf_counter()
+        deadline = None if self.time_budget is None else start + self.time_budget
+
+        features, actions = tetris.afterstates()
+        actions = actions.copy()
+        root_scores = self.scorer(features)
+
+        node_budget = None if self.node_budget is None else self.node_budget - len(actions)
+        values, nodes, depth_reached, deadline_hit = self._search(tetris, root_scores, actions, deadline, node_budget)
+        best_action_index = int(np.argmax(values))
+
+        self._record_stats(start, len(actions) + nodes, depth_reached, deadline_hit)
+
+        return best_action_index, actions[best_action_index]
+
+    def _search(self, tetris, root_scores, actions, deadline, node_budget):
+        '''
+        Beam search below the placements `actions` of the next tile, whose scores are `root_scores`
+
+        Returns (value of each root, nodes generated below the roots, depth reached, whether the budget
+        ran out). A root is worth its best descendant at the deepest level reached
+        '''
+        # frontier of (root index, path of (action, tile)) to expand at the next level
+        frontier = [(root, [(actions[root], tetris.next_tile)]) for root in self._best(root_scores)]
+        values = root_scores
+        nodes = 0
+        depth_reached = 1
+        deadline_hit = False
+
+        for tile in tetris.preview[:self.depth - 1]:
+            level_features = []
+            level_nodes = []
+
+            for root, path in frontier:
+                if self._out_of_budget(nodes, node_budget, deadline):
+                    deadline_hit = True
+                    break
+
+                undo_logs = [tetris.push_placement(*tetris.decode_action(action), tile=placed_tile) for action, placed_tile in path]
+
+                if tetris.can_spawn(tile):
+                    child_features, child_actions = tetris.afterstates(tile)
+                    level_features.append(child_features.copy())
+                    level_nodes += [(root, path + [(child_action, tile)]) for child_action in child_actions.copy()]
+                    nodes += len(child_actions)
+
+                for undo_log in reversed(undo_logs):
+                    tetris.pop_placement(undo_log)
+
+            if not level_nodes:
+                break
+
+            level_scores = self.scorer(np.concatenate(level_features))
+
+            # unexpanded roots lose
+            values = np.full(len(actions), -np.inf, dtype=np.float64)
+            np.maximum.at(values, [root for root, _ in level_nodes], level_scores)
+            depth_reached += 1
+
+            frontier = [level_nodes[i] for i in self._best(level_scores)]
+
+            if deadline_hit:
+                break
+
+        return values, nodes, depth_reached, deadline_hit
+
+    def _record_stats(self, start, nodes, depth_reached, deadline_hit):
+        seconds = time.perf_counter() - start
+        self.last_stats = {
+            "nodes": nodes,
+            "seconds": seconds,
+            "nodes_per_sec": nodes / seconds if seconds > 0 else 0.0,
+            "depth_reached": depth_reached,
+            "deadline_hit": deadline_hit,
+        }
+
+    def _best(self, scores):
+        if len(scores) <= self.beam_width:
+            return np.argsort(-scores)
+        best = np.argpartition(-scores, self.beam_width - 1)[:self.beam_width]
+        return best[np.argsort(-scores[best])]
+
+    def _out_of_budget(self, nodes, node_budget, deadline):
+        if node_budget is not None and nodes >= node_budget:
+            return True
+        return deadline is not None and time.perf_counter() >= deadline
+
+class RootParallelPlanner(BeamPlanner):
+    '''
+    Beam search run separately below each placement of the next tile, with its own beam of `beam_width`
+
+    The subtrees are independent, so they are split over `num_workers` forked processes (0 searches them
+    in this process, as the single-core baseline). Workers get `Tetris.snapshot()` of the position and
+    the root actions to expand, and send back one value per root. `node_budget` is split evenly between
+    the roots, so the result doesn't depend on the number of workers unless `time_budget` runs out
+
+    The scorer is inherited by the forked workers, so it should only use NumPy (e.g. `heuristic_scorer`
+    or a NumPy forward pass), not a model living in a TensorFlow session. Call `close()` when done
+    '''
+
+    def __init__(self, scorer=heuristic_scorer, depth=3, beam_width=8, node_budget=None, time_budget=None, num_workers=None) -> None:
+        super().__init__(scorer, depth, beam_width, node_budget, time_budget)
+        self.num_workers = mp.cpu_count() if num_workers is None else num_workers
+        self._pool = None
+
+    def choose(self, tetris):
+        start = time.perf_counter()
+        # one absolute deadline for the whole move, so pool dispatch and pickling count against it too
+        # (perf_counter is system-wide, forked workers compare against it directly)
+        deadline = None if self.time_budget is None else start + self.time_budget
+
+        features, actions = tetris.afterstates()
+        actions = actions.copy()
+        root_scores = self.scorer(features)
+
+        root_budget = None if self.node_budget is None else max(self.node_budget - len(actions), 0) // max(len(actions), 1)
+        task = (tetris.snapshot(), tetris.full_search, root_budget, deadline)
+
+        if self.num_workers == 0:
+            results = [_search_roots(self, tetris, task, root_scores, actions)]
+            chunks = [np.arange(len(actions))]
+        else:
+            if self._pool is None:
+                self._pool = mp.get_context("fork").Pool(self.num_workers, initializer=_init_worker, initargs=(self,))
+            chunks = [np.arange(worker, len(actions), self.num_workers) for worker in range(self.num_workers)]
+            chunks = [chunk for chunk in chunks if len(chunk)]
+            results = self._pool.starmap(
+                _search_roots_in_worker,
+                [(tetris.WIDTH, tetris.HEIGHT, task, root_scores[chunk], actions[chunk]) for chunk in chunks],
+            )
+
+        # merge the values of every chunk back into root order
+        values = np.empty(len(actions), dtype=np.float64)
+        depths = np.ones(len(actions), dtype=np.int64)
+        nodes = len(actions)
+        deadline_hit = False
+        for chunk, (chunk_values, chunk_depths, chunk_nodes, chunk_deadline_hit) in zip(chunks, results):
+            values[chunk] = chunk_values
+            depths[chunk] = chunk_depths
+            nodes += chunk_nodes
+            deadline_hit |= chunk_deadline_hit
+
+        # as in BeamPlanner, roots whose subtree didn't reach the deepest level lose
+        depth_reached = int(depths.max()) if len(depths) else 1
+        values[depths < depth_reached] = -np.inf
+
+        best_action_index = int(np.argmax(values))
+
+        self._record_stats(start, nodes, depth_reached, deadline_hit)
+
+        return best_action_index, actions[best_action_index]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+# state of a RootParallelPlanner worker process: the planner and one engine per board size
+_worker_planner = None
+_worker_engines = {}
+
+def _init_worker(planner):
+    global _worker_planner
+    _worker_planner = planner
+    # the worker's copy of the planner must not try to use the parent's pool
+    _worker_planner._pool = None
+
+def _search_roots_in_worker(width, height, task, root_scores, actions):
+    snapshot = task[0]
+    key = (width, height, len(snapshot[4]))
+    if key not in _worker_engines:
+        _worker_engines[key] = BitboardTetris(width, height, preview_size=len(snapshot[4]))
+    tetris = _worker_engines[key]
+    tetris.load_snapshot(snapshot)
+
+    return _search_roots(_worker_planner, tetris, task, root_scores, actions)
+
+def _search_roots(planner, tetris, task, root_scores, actions):
+    '''
+    Search the subtree of each of `actions` on `tetris`, which holds the position of the snapshot in `task`
+
+    Returns (value of each root, depth reached below each root, nodes generated, whether the budget ran out)
+    '''
+    _, full_search, root_budget, deadline = task
+
+    saved_full_search = tetris.full_search
+    tetris.full_search = full_search
+
+    values = np.empty(len(actions), dtype=np.float64)
+    depths = np.ones(len(actions), dtype=np.int64)
+    nodes = 0
+    deadline_hit = False
+    for i in range(len(actions)):
+        root_values, root_nodes, depths[i], root_deadline_hit = planner._search(
+            tetris, root_scores[i:i+1], actions[i:i+1], deadline, root_budget
+        )
+        values[i] = root_values[0]
+        nodes += root_nodes
+        deadline_hit |= root_deadline_hit
+
+    tetris.full_search = saved_full_search
+
+    return values, depths, nodes, deadline_hit
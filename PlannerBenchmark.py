@@ -0,0 +1,82 @@
+'''
+Compares the root-parallel planner against the same search on a single core
+
+Both search the same fixed set of positions with the same node budget, positions are taken from
+seeded games played by the greedy planner.
+'''
+import argparse
+import time
+
+from BitboardTetris import BitboardTetris
+from Planner import BeamPlanner, RootParallelPlanner
+from PieceGenerator import GENERATORS
+
+def benchmark_positions(width, height, preview_size, count, spacing, seed, generator="uniform"):
+    '''
+    Snapshots of every `spacing`th position of seeded greedy games, `count` of them
+    '''
+    tetris = BitboardTetris(width, height, preview_size=preview_size, generator=generator)
+    greedy = BeamPlanner(depth=1)
+    positions = []
+
+    game = 0
+    while len(positions) < count:
+        tetris.reset_state(seed + game)
+        game += 1
+
+        step = 0
+        while not tetris.terminal_state and len(positions) < count:
+            if step % spacing == 0:
+                positions.append(tetris.snapshot())
+            _, action = greedy.choose(tetris)
+            tetris.take_action(*tetris.decode_action(action))
+            step += 1
+
+    return positions
+
+def run(planner, positions, width, height, preview_size):
+    tetris = BitboardTetris(width, height, preview_size=preview_size)
+    moves = []
+    nodes = 0
+
+    start = time.perf_counter()
+    for snapshot in positions:
+        tetris.load_snapshot(snapshot)
+        index, _ = planner.choose(tetris)
+        moves.append(index)
+        nodes += planner.last_stats["nodes"]
+    elapsed = time.perf_counter() - start
+
+    return moves, nodes, elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--height", type=int, default=18)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--beam-width", type=int, default=8)
+    parser.add_argument("--node-budget", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the number of cores")
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--spacing", type=int, default=10, help="moves between benchmark positions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--generator", choices=list(GENERATORS), default="uniform", help="piece generator of the benchmark games")
+    args = parser.parse_args()
+
+    preview_size = args.depth - 1
+    positions = benchmark_positions(args.width, args.height, preview_size, args.positions, args.spacing, args.seed, args.generator)
+
+    single = RootParallelPlanner(depth=args.depth, beam_width=args.beam_width, node_budget=args.node_budget, num_workers=0)
+    parallel = RootParallelPlanner(depth=args.depth, beam_width=args.beam_width, node_budget=args.node_budget, num_workers=args.workers)
+
+    # the first call starts the worker pool, keep it out of the timing
+    parallel.choose(BitboardTetris(args.width, args.height, preview_size=preview_size))
+
+    single_moves, single_nodes, single_time = run(single, positions, args.width, args.height, preview_size)
+    parallel_moves, parallel_nodes, parallel_time = run(parallel, positions, args.width, args.height, preview_size)
+    parallel.close()
+
+    print(f"{len(positions)} positions, depth {args.depth}, beam width {args.beam_width}, node budget {args.node_budget}")
+    print(f"  single core: {single_time:7.2f}s {single_nodes/single_time:9.0f} nodes/s")
+    print(f"{parallel.num_workers:>4} workers: {parallel_time:7.2f}s {parallel_nodes/parallel_time:9.0f} nodes/s")
+    print(f"speedup: {single_time/parallel_time:.2f}x, same move in {sum(a == b for a, b in zip(single_moves, parallel_moves))}/{len(positions)} positions")
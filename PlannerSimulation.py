@@ -0,0 +1,27 @@
+from Tetris import Tetris
+from Planner import BeamPlanner
+from Renderer import AsyncRenderer
+
+t = Tetris(10, 18, preview_size=1, record=True)
+planner = BeamPlanner(depth=2, beam_width=8, time_budget=0.05)
+video = AsyncRenderer("simulation/simulation.mp4", 10, 18)
+
+step = 0
+nodes = 0
+seconds = 0
+while not t.terminal_state:
+    step += 1
+
+    # pick the placement whose best follow-up with the previewed tile scores highest
+    _, action = planner.choose(t)
+    nodes += planner.last_stats["nodes"]
+    seconds += planner.last_stats["seconds"]
+
+    point, orientation = t.decode_action(action)
+    t.take_action(point, orientation)
+
+    video.submit(t)
+
+video.close()
+t.trace.save("simulation/game.trace")
+print(f"Finished. Rendered {step} frames, cleared {t.total_lines_cleared} lines, {nodes/seconds:.0f} nodes/s")
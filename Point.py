@@ -9,6 +9,9 @@ class Point:
     def __eq__(self, other: 'Point') -> bool:
         return self.x == other.x and self.y == other.y
 
+    def __hash__(self) -> int:
+        return hash((self.x, self.y))
+
     def __str__(self) -> str:
         return f"({self.x}, {self.y})"
 
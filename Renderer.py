@@ -0,0 +1,226 @@
+'''
+Headless rendering of Tetris boards to RGB frames, PNGs, videos and GIFs
+
+AsyncRenderer moves drawing and encoding to a background thread, so a simulation only pays for
+copying the board into a queue.
+
+A frame is built by looking up every tile of `Tetris.board_array()` in a table of pre-scaled tile
+sprites, so drawing costs a few NumPy operations regardless of the board. The font and the rendered
+"Next tile" captions are loaded once and cached.
+'''
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from Tetris import TETRIS_COLORS
+
+# colours of the tiles of the latest placement, by whether the tile is filled
+HIGHLIGHT_COLORS = [[110, 90, 90], [221, 182, 182]]
+
+class Renderer:
+
+    def __init__(self, width, height, tile_size=32, font_path="arial.ttf", font_size=18) -> None:
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.tile_size = tile_size
+
+        # palette index of a tile is its board value + `_value_offset`, highlighted tiles come after
+        self._value_offset = -min(TETRIS_COLORS)
+        palette = [TETRIS_COLORS[value] for value in range(min(TETRIS_COLORS), max(TETRIS_COLORS) + 1)]
+        self._highlight_index = len(palette)
+        palette += HIGHLIGHT_COLORS
+
+        self._sprites = np.broadcast_to(
+            np.array(palette, dtype=np.uint8)[:, None, None, :], (len(palette), tile_size, tile_size, 3)
+        ).copy()
+
+        # GIF palette: every tile colour blended towards the black caption text in 16 steps
+        shades = np.array(palette, dtype=np.float32)[:, None, :] * (1 - np.arange(16, dtype=np.float32)[None, :, None] / 15)
+        self.palette = Image.new("P", (1, 1))
+        self.palette.putpalette(np.rint(shades).astype(np.uint8).reshape(-1).tolist())
+
+        self._font = ImageFont.truetype(font_path, font_size)
+        self._captions: dict[str, np.ndarray] = {}
+
+    def draw(self, tetris, board=None):
+        '''
+        Returns the frame of `tetris` (or of `board`, in the layout of `tetris.board`) as an RGB uint8
+        array of shape (HEIGHT * tile_size, WIDTH * tile_size, 3)
+        '''
+        if board is None:
+            tiles = tetris.board_array()
+        else:
+            tiles = np.array(board, dtype=np.int8).T
+
+        return self.draw_tiles(tiles, tetris.latest_placement, tetris.next_tile)
+
+    def draw_tiles(self, tiles, latest_placement, next_tile):
+        '''
+        Returns the frame of a board given as an array like `Tetris.board_array()`
+        '''
+        indices = tiles.astype(np.intp) + self._value_offset
+        for x, y in latest_placement:
+            indices[y, x] = self._highlight_index + (tiles[y, x] == 1)
+
+        # row y of the board is drawn HEIGHT-1-y rows from the top
+        frame = self._sprites[indices[::-1]]
+        frame = frame.transpose(0, 2, 1, 3, 4).reshape(self.HEIGHT * self.tile_size, self.WIDTH * self.tile_size, 3)
+
+        self._draw_caption(frame, f"Next tile: {next_tile}", 20, 20)
+
+        return frame
+
+    def save(self, tetris, path, board=None):
+        '''
+        Write the frame of `tetris` to an image file at `path`
+        '''
+        Image.fromarray(self.draw(tetris, board)).save(path)
+
+    def _draw_caption(self, frame, text, x, y):
+        alpha = self._captions.get(text)
+        if alpha is None:
+            _, _, right, bottom = self._font.getbbox(text)
+            mask = Image.new("L", (right, bottom), 0)
+            ImageDraw.Draw(mask).text((0, 0), text, 255, font=self._font)
+            alpha = np.asarray(mask, dtype=np.float32)[:, :, None] / 255
+            self._captions[text] = alpha
+
+        # black text, blended by coverage, clipped to the frame
+        region = frame[y:y+alpha.shape[0], x:x+alpha.shape[1]]
+        alpha = alpha[:region.shape[0], :region.shape[1]]
+        region[:] = region * (1 - alpha)
+
+class VideoWriter:
+    '''
+    Streams frames from `Renderer.draw` into one video file, a GIF if `path` ends in `.gif`
+
+    Videos are encoded by OpenCV as frames arrive. GIF frames are palettised as they arrive and
+    written on `close()`, so GIFs suit short clips. Pass the `palette` of the Renderer to map GIF frames
+    onto its fixed palette, which is much faster than computing an adaptive one per frame
+    '''
+
+    def __init__(self, path, fps=10, palette=None) -> None:
+        self.path = path
+        self.fps = fps
+        self.palette = palette
+        self.frames_written = 0
+
+        self._gif = path.lower().endswith(".gif")
+        self._gif_frames = []
+        self._video = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, frame):
+        if self._gif:
+            if self.palette is None:
+                image = Image.fromarray(frame).quantize(colors=64, dither=Image.Dither.NONE)
+            else:
+                image = Image.fromarray(frame).quantize(palette=self.palette, dither=Image.Dither.NONE)
+            self._gif_frames.append(image)
+        else:
+            if self._video is None:
+                height, width = frame.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(*("XVID" if self.path.lower().endswith(".avi") else "mp4v"))
+                self._video = cv2.VideoWriter(self.path, fourcc, self.fps, (width, height))
+            self._video.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+        self.frames_written += 1
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+        if self._gif_frames:
+            first, *rest = self._gif_frames
+            first.save(self.path, save_all=True, append_images=rest, duration=round(1000 / self.fps), loop=0)
+            self._gif_frames = []
+
+class AsyncRenderer:
+    '''
+    Renders frames to a VideoWriter on a background thread
+
+    `submit` only puts a compact snapshot of the game (board bytes, latest placement, next tile) into a
+    queue of at most `max_queue` frames. When the queue is full `submit` blocks until the thread catches
+    up, or with `drop_frames=True` (for live viewing) the frame is skipped and counted in `frames_dropped`
+    '''
+
+    def __init__(self, path, width, height, fps=10, max_queue=64, drop_frames=False) -> None:
+        self.WIDTH = width
+        self.HEIGHT = height
+        self.drop_frames = drop_frames
+        self.frames_dropped = 0
+
+        self.renderer = Renderer(width, height)
+        self.writer = VideoWriter(path, fps, self.renderer.palette)
+
+        self._frames = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def frames_written(self):
+        return self.writer.frames_written
+
+    def submit(self, tetris):
+        if self._error is not None:
+            raise self._error
+
+        frame = (tetris.board_array().tobytes(), tuple(tetris.latest_placement), tetris.next_tile)
+
+        if self.drop_frames:
+            try:
+                self._frames.put_nowait(frame)
+            except queue.Full:
+                self.frames_dropped += 1
+        else:
+            self._frames.put(frame)
+
+    def close(self):
+        '''
+        Wait for every submitted frame to be written and close the file
+        '''
+        if self._thread.is_alive():
+            self._frames.put(None)
+            self._thread.join()
+        self.writer.close()
+
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            frame = self._frames.get()
+            if frame is None:
+                return
+
+            # keep draining after an error so submit() never blocks on a dead thread
+            if self._error is not None:
+                continue
+
+            try:
+                board_bytes, latest_placement, next_tile = frame
+                tiles = np.frombuffer(board_bytes, dtype=np.int8).reshape(self.HEIGHT, self.WIDTH)
+                self.writer.write(self.renderer.draw_tiles(tiles, latest_placement, next_tile))
+            except Exception as error:
+                self._error = error
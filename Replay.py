@@ -0,0 +1,105 @@
+'''
+Rebuilds and renders the frames of a game recorded as a GameTrace
+
+Replaying a trace once takes a checkpoint of the board every `checkpoint_interval` moves, after that
+any frame is rebuilt from the nearest checkpoint before it, so a range of frames can be rendered
+without replaying the game from the start.
+
+Frame i is the board after move i, as the simulations render it.
+'''
+import argparse
+
+from GameTrace import GameTrace
+from BitboardTetris import BitboardTetris
+from Point import Point
+import Tetromino
+
+class GameReplay:
+
+    def __init__(self, trace: GameTrace, checkpoint_interval=50, engine=BitboardTetris) -> None:
+        self.trace = trace
+        self.checkpoint_interval = checkpoint_interval
+        self.tetris = engine(trace.WIDTH, trace.HEIGHT, preview_size=trace.preview_size, generator=trace.generator)
+
+        # checkpoints[k] is the position before move k * checkpoint_interval:
+        # (snapshot, piece generator state, tiles placed)
+        self.checkpoints = []
+
+        self.tetris.reset_state(trace.seed)
+        for index in range(len(trace)):
+            if index % checkpoint_interval == 0:
+                self.checkpoints.append(self._checkpoint())
+            self._play(index)
+
+    def __len__(self):
+        return len(self.trace)
+
+    def seek(self, index):
+        '''
+        Put the replay engine (`self.tetris`) in the position right after move `index` and return it
+        '''
+        if not 0 <= index < len(self.trace):
+            raise IndexError(f"move {index} out of range for a trace of {len(self.trace)} moves")
+
+        start = index - index % self.checkpoint_interval
+        snapshot, generator_state, tiles_placed = self.checkpoints[start // self.checkpoint_interval]
+
+        tetris = self.tetris
+        tetris.load_snapshot(snapshot)
+        tetris._pieces.setstate(generator_state)
+        tetris.tiles_placed = tiles_placed
+
+        for move in range(start, index + 1):
+            self._play(move)
+
+        return tetris
+
+    def frames(self, start=0, stop=None):
+        '''
+        Yields the engine in the position after each move in [start, stop), playing forward from the
+        checkpoint before `start` only once
+        '''
+        stop = len(self.trace) if stop is None else min(stop, len(self.trace))
+        if start >= stop:
+            return
+
+        tetris = self.seek(start)
+        yield tetris
+        for index in range(start + 1, stop):
+            self._play(index)
+            yield tetris
+
+    def _checkpoint(self):
+        tetris = self.tetris
+        return tetris.snapshot(), tetris._pieces.getstate(), tetris.tiles_placed
+
+    def _play(self, index):
+        tile, x, y, rotation = self.trace.move(index)
+        tetris = self.tetris
+        if tetris.next_tile != tile:
+            raise ValueError(f"move {index} places {tile} but the replay drew {tetris.next_tile}, trace and engine disagree")
+
+        tetris.take_action(Point(x, y), Tetromino.ORIENTATIONS[rotation])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("trace", help="game trace file")
+    parser.add_argument("output", help="video (.mp4/.avi/.gif) to write the frames to, or an image for a single frame")
+    parser.add_argument("--start", type=int, default=0, help="first frame to render")
+    parser.add_argument("--stop", type=int, default=None, help="frame to stop before, defaults to the end of the game")
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--checkpoint-interval", type=int, default=50)
+    args = parser.parse_args()
+
+    from Renderer import Renderer, VideoWriter
+
+    replay = GameReplay(GameTrace.load(args.trace), args.checkpoint_interval)
+    renderer = Renderer(replay.trace.WIDTH, replay.trace.HEIGHT)
+
+    if args.output.lower().endswith((".mp4", ".avi", ".gif")):
+        with VideoWriter(args.output, args.fps, renderer.palette) as video:
+            for tetris in replay.frames(args.start, args.stop):
+                video.write(renderer.draw(tetris))
+        print(f"Rendered {video.frames_written} frames of {len(replay)}")
+    else:
+        renderer.save(replay.seek(args.start), args.output)
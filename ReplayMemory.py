@@ -0,0 +1,283 @@
+import json
+import os
+
+import numpy as np
+
+class ReplayMemory:
+    '''
+    Fixed size replay memory of (state, next_state, reward, done) transitions
+
+    Transitions live in preallocated NumPy arrays written through a circular index, once full the
+    oldest transition is overwritten. Batches are sampled as index arrays, so sampling does no
+    per-transition Python work
+
+    If `path` is given the arrays are memory-mapped `.npy` files in that directory, and an existing
+    memory there is reopened, so long runs can resume without refilling it (call `flush()` to persist)
+
+    With `packed=True` states are 0/1 boards (e.g. `Tetris.board_state()`) stored bit-packed, one bit
+    per tile, and unpacked to `state_shape` uint8 arrays when sampled
+    '''
+
+    def __init__(self, capacity, state_shape=(4,), state_dtype=np.float32, path=None, seed=None, packed=False) -> None:
+        self.capacity = capacity
+        self.path = path
+        self._rng = np.random.default_rng(seed)
+
+        self.state_shape = tuple(state_shape)
+        self.packed = packed
+        if packed:
+            state_shape = ((int(np.prod(state_shape)) + 7) // 8,)
+            state_dtype = np.uint8
+
+        self.index = 0
+        self.size = 0
+
+        shapes = {
+            "states": ((capacity, *state_shape), state_dtype),
+            "next_states": ((capacity, *state_shape), state_dtype),
+            "rewards": ((capacity,), np.float32),
+            "dones": ((capacity,), np.bool_),
+        }
+
+        if path is None:
+            arrays = {name: np.zeros(shape, dtype=dtype) for name, (shape, dtype) in shapes.items()}
+        else:
+            os.makedirs(path, exist_ok=True)
+            resume = os.path.exists(self._meta_path())
+            arrays = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(path, f"{name}.npy"), mode="r+" if resume else "w+", dtype=dtype, shape=shape
+                )
+                for name, (shape, dtype) in shapes.items()
+            }
+            if resume:
+                # r+ takes the shape and dtype from the file, a memory created with other settings must not be reused
+                for name, (shape, dtype) in shapes.items():
+                    if arrays[name].shape != shape or arrays[name].dtype != np.dtype(dtype):
+                        raise ValueError(f"{name}.npy in {path} holds {arrays[name].shape} {arrays[name].dtype}, this memory "
+                                         f"needs {shape} {np.dtype(dtype)} (capacity, state shape or packing changed)")
+                with open(self._meta_path()) as f:
+                    meta = json.load(f)
+                self.index, self.size = meta["index"], meta["size"]
+
+        self.states = arrays["states"]
+        self.next_states = arrays["next_states"]
+        self.rewards = arrays["rewards"]
+        self.dones = arrays["dones"]
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        '''
+        Memory taken by the transition arrays in bytes
+        '''
+        return self.states.nbytes + self.next_states.nbytes + self.rewards.nbytes + self.dones.nbytes
+
+    def append(self, state, next_state, reward, done):
+        i = self.index
+        self.states[i] = self._pack(state)
+        self.next_states[i] = self._pack(next_state)
+        self.rewards[i] = reward
+        self.dones[i] = done
+
+        self.index = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, states, next_states, rewards, dones):
+        '''
+        Append a batch of transitions given as arrays with the same first dimension
+        '''
+        n = len(rewards)
+        indices = (self.index + np.arange(n)) % self.capacity
+        self.states[indices] = self._pack(states, batch=True)
+        self.next_states[indices] = self._pack(next_states, batch=True)
+        self.rewards[indices] = rewards
+        self.dones[indices] = dones
+
+        self.index = (self.index + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size):
+        '''
+        Returns (states, next_states, rewards, dones) arrays of `batch_size` distinct transitions sampled uniformly
+        '''
+        indices = self._rng.choice(self.size, batch_size, replace=False)
+        return self._unpack(self.states[indices]), self._unpack(self.next_states[indices]), self.rewards[indices], self.dones[indices]
+
+    def flush(self):
+        '''
+        Write a memory-mapped memory to disk so it can be reopened from `path`
+        '''
+        if self.path is None:
+            return
+
+        for array in (self.states, self.next_states, self.rewards, self.dones):
+            array.flush()
+        with open(self._meta_path(), "w") as f:
+            json.dump({"index": self.index, "size": self.size}, f)
+
+    def getstate(self):
+        '''
+        Returns a copy of the stored transitions, the write position and the sampling RNG, for checkpoints
+        '''
+        size = self.size
+        return {
+            "index": self.index,
+            "size": size,
+            "rng": self._rng.bit_generator.state,
+            "states": self.states[:size].copy(),
+            "next_states": self.next_states[:size].copy(),
+            "rewards": self.rewards[:size].copy(),
+            "dones": self.dones[:size].copy(),
+        }
+
+    def setstate(self, state):
+        size = state["size"]
+        if size > self.capacity or state["states"].shape[1:] != self.states.shape[1:]:
+            raise ValueError(f"replay state of {size} transitions of shape {state['states'].shape[1:]} does not fit a memory "
+                             f"of {self.capacity} of shape {self.states.shape[1:]}")
+
+        self.states[:size] = state["states"]
+        self.next_states[:size] = state["next_states"]
+        self.rewards[:size] = state["rewards"]
+        self.dones[:size] = state["dones"]
+        self.index, self.size = state["index"], size
+        self._rng.bit_generator.state = state["rng"]
+
+    def _pack(self, states, batch=False):
+        if not self.packed:
+            return states
+        states = np.asarray(states, dtype=np.uint8)
+        if batch:
+            return np.packbits(states.reshape(len(states), -1), axis=1)
+        return np.packbits(states.reshape(-1))
+
+    def _unpack(self, states):
+        if not self.packed:
+            return states
+        size = int(np.prod(self.state_shape))
+        return np.unpackbits(states, axis=1, count=size).reshape(len(states), *self.state_shape)
+
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+class SumTree:
+    '''
+    Binary tree where every node holds the sum of its children, over `capacity` leaf priorities
+
+    Leaves sit at `num_leaves + i` of a flat array (node k has children 2k and 2k+1), so updates and
+    prefix-sum searches are O(log n). Both are done level by level over whole index batches
+    '''
+
+    def __init__(self, capacity) -> None:
+        self.num_leaves = 1 << max(capacity - 1, 0).bit_length()
+        self.depth = self.num_leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.num_leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, indices):
+        return self.tree[self.num_leaves + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        nodes = self.num_leaves + np.asarray(indices)
+        self.tree[nodes] = priorities
+
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        '''
+        Returns the leaf index of each of `values` in the prefix sums of the priorities, i.e. the first
+        leaf i with `sum(priorities[:i+1]) > value`
+        '''
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0)
+            nodes = left + go_right
+
+        return nodes - self.num_leaves
+
+class PrioritizedReplayMemory(ReplayMemory):
+    '''
+    Replay memory sampling transitions with probability proportional to `priority ** alpha`
+
+    Priorities are the absolute TD errors passed to `update_priorities`, new transitions get the highest
+    priority seen so far so they are sampled at least once. `sample` also returns the indices to update
+    and importance-sampling weights `(N * P(i)) ** -beta` normalised by their max, beta is annealed to 1
+    over `beta_steps` calls to `sample`
+    '''
+
+    def __init__(self, capacity, state_shape=(4,), state_dtype=np.float32, path=None, seed=None, packed=False,
+                 alpha=0.6, beta=0.4, beta_steps=100000, priority_epsilon=1e-3) -> None:
+        super().__init__(capacity, state_shape, state_dtype, path, seed, packed)
+
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = (1 - beta) / beta_steps
+        self.priority_epsilon = priority_epsilon
+
+        self.priorities = SumTree(capacity)
+        self.max_priority = 1.0
+
+        # priorities aren't persisted, give a reopened memory uniform ones
+        if self.size:
+            self.priorities.update(np.arange(self.size), self.max_priority)
+
+    def append(self, state, next_state, reward, done):
+        index = self.index
+        super().append(state, next_state, reward, done)
+        self.priorities.update([index], self.max_priority)
+
+    def extend(self, states, next_states, rewards, dones):
+        indices = (self.index + np.arange(len(rewards))) % self.capacity
+        super().extend(states, next_states, rewards, dones)
+        self.priorities.update(indices, self.max_priority)
+
+    def sample(self, batch_size):
+        '''
+        Returns (states, next_states, rewards, dones, indices, weights)
+        '''
+        # one value in each of batch_size equal segments of the total priority
+        segment = self.priorities.total / batch_size
+        values = (np.arange(batch_size) + self._rng.random(batch_size)) * segment
+        indices = np.minimum(self.priorities.find(values), self.size - 1)
+
+        probabilities = self.priorities[indices] / self.priorities.total
+        weights = (self.size * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return (
+            self._unpack(self.states[indices]), self._unpack(self.next_states[indices]), self.rewards[indices], self.dones[indices],
+            indices, weights.astype(np.float32),
+        )
+
+    def getstate(self):
+        state = super().getstate()
+        state["priorities"] = self.priorities[np.arange(self.size)]
+        state["max_priority"] = self.max_priority
+        state["beta"] = self.beta
+        return state
+
+    def setstate(self, state):
+        super().setstate(state)
+        self.priorities = SumTree(self.capacity)
+        if self.size:
+            self.priorities.update(np.arange(self.size), state["priorities"])
+        self.max_priority = state["max_priority"]
+        self.beta = state["beta"]
+
+    def update_priorities(self, indices, td_errors):
+        priorities = (np.abs(td_errors) + self.priority_epsilon) ** self.alpha
+        self.priorities.update(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
@@ -1,12 +1,14 @@
 from copy import deepcopy
 import time
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
 import cv2
 import random
 
 from Point import Point
 import Tetromino
+from GameTrace import GameTrace
+from PieceGenerator import GENERATORS
+from Metrics import clock
 
 TETRIS_COLORS = {
     -1: [0, 0, 0],
@@ -14,57 +16,130 @@ TETRIS_COLORS = {
     1 : [164,182,221],
 }
 
+_zobrist_tables: dict[tuple[int, int], list[list[int]]] = {}
+
+def _zobrist_keys(width, height):
+    '''
+    Random 64 bit key for every tile of a `width` x `height` board, the same for every instance so
+    hashes can be shared between games
+    '''
+    if (width, height) not in _zobrist_tables:
+        rng = random.Random(width * 1000 + height)
+        _zobrist_tables[(width, height)] = [[rng.getrandbits(64) for _ in range(height)] for _ in range(width)]
+    return _zobrist_tables[(width, height)]
+
+def _bumpiness_term(left_height, right_height):
+    '''
+    Bumpiness between two neighbouring columns given their heights (y of the top tile + 1)
+
+    Matches `Tetris._calc_bumpiness`: a pair is skipped if the right column is empty or the
+    top of the left column is empty or at y == 0
+    '''
+    if left_height < 2 or right_height == 0:
+        return 0
+    return abs(left_height - right_height)
+
 class Tetris:
 
-    def __init__(self, width, height, seed=None) -> None:
+    def __init__(self, width, height, seed=None, full_search=False, cache=None, preview_size=1, record=False, generator="uniform") -> None:
         self.WIDTH = width
         self.HEIGHT = height
-        
 
-        if seed:
-            self._random_seed = seed
-        else:
-             self._random_seed = random.Random()
+        # number of tiles after `next_tile` that are known in advance, see `preview`
+        self.preview_size = preview_size
+
+        # always search placements with _bfs, even when dropping from above finds the same ones
+        self.full_search = full_search
+
+        # optional TranspositionCache of placements and afterstates, keyed by the Zobrist hash of the board
+        self.cache = cache
+        self._zobrist_keys = _zobrist_keys(width, height)
+
+        # _bfs states are encoded as integers over anchor points, padded so a neighbour of any
+        # legal anchor still has its own slot
+        self._search_offset = Tetromino.ANCHOR_PADDING + 1
+        self._search_stride = height + self._search_offset
+        self._search_visited = [0] * ((width + self._search_offset + 1) * self._search_stride * len(Tetromino.ORIENTATIONS))
+        self._search_id = 0
+
+        # afterstates() buffers, sized for the largest possible number of end states
+        self._afterstate_buffer = np.zeros((len(self._search_visited), 4), dtype=np.float32)
+        self._action_buffer = np.zeros((len(self._search_visited), 3), dtype=np.int32)
+
+        # board_afterstates() buffers, allocated on first use
+        self._board_buffer = None
+        self._board_rows_buffer = None
+        self._column_shifts = np.arange(width, dtype=np.int64)
+
+        self._renderer = None
+
+        # optional Metrics timing the search, feature and action phases, and counting _search nodes
+        self.metrics = None
+        self._search_nodes = 0
+
+        # every episode is played with its own seed drawn from `seed`, so a seeded engine plays the same
+        # sequence of games. `seed=None` seeds from the OS
+        self.seed = seed
+        self._episode_seeds = random.Random(seed)
+
+        # name of the PieceGenerator the tiles are drawn from, see PieceGenerator.GENERATORS
+        self.generator = generator
+
+        # record a GameTrace of every episode in `trace`
+        self.record = record
+        self.trace = None
 
         self.reset_state()
 
     def render(self, board=None, img_location="render.png") -> None:
         '''
         Draw board to screen
+
+        Uses a Renderer cached on the instance, stream many frames with Renderer.VideoWriter instead of
+        saving one image per step
         '''
-        if board is None:
-            board = self.board
+        if self._renderer is None:
+            from Renderer import Renderer
+            self._renderer = Renderer(self.WIDTH, self.HEIGHT)
 
-        pixel_data = []
-        for y in range(len(board[0])-1, -1, -1):
-            for x in range(len(board)):
-                if (x, y) in self.latest_placement:
-                    pixel_data.append([221,182,182] if board[x][y] == 1 else [110, 90, 90])
-                else:
-                    pixel_data.append(TETRIS_COLORS[board[x][y]])
+        self._renderer.save(self, img_location, board)
 
+    def board_array(self):
+        '''
+        The board as an int8 array of shape (HEIGHT, WIDTH), indexed [y, x]
+        '''
+        return np.array(self.board, dtype=np.int8).T
 
-        pixel_data = np.array(pixel_data).reshape(self.HEIGHT, self.WIDTH, 3).astype(np.uint8)
-        img = Image.fromarray(pixel_data) 
-        img = img.resize((self.WIDTH*32, self.HEIGHT*32), resample=Image.Resampling.NEAREST)
+    def get_actions(self):
+        if self.metrics is not None:
+            start = clock()
 
-        draw = ImageDraw.Draw(img)
-        
-        draw.text((20, 20), f"Next tile: {self.next_tile}", (0, 0, 0), font = ImageFont.truetype("arial.ttf", 18))
+        tetromino = Tetromino.PIECES[self.next_tile]
 
-        img.save(img_location)
+        if self.cache is not None:
+            end_states = self._cached_placements(tetromino)[0]
+        else:
+            end_states = self._placements(tetromino)
 
-    def get_actions(self):
-        tetromino = Tetromino.PIECES[self.next_tile]
+        actions = [(Point(x, y), Tetromino.ORIENTATIONS[rotation]) for x, y, rotation in end_states]
 
-        return self._bfs(tetromino, self._spawn_point(), "right")
+        if self.metrics is not None:
+            self.metrics.add_time("get_actions", start)
+
+        return actions
 
     def take_action(self, point: Point, orientation: str):
+        if self.metrics is not None:
+            start = clock()
+
         tetromino = Tetromino.PIECES[self.next_tile][orientation]
 
         # if this fails action is illegal
         assert self._is_legal_placement(tetromino, point) 
 
+        if self.trace is not None:
+            self.trace.append(self.next_tile, point.x, point.y, Tetromino.ORIENTATIONS.index(orientation))
+
         highest_placement = self._place_tetronimo(tetromino, point)
         if highest_placement > self.highest_tile:
             self.highest_tile = highest_placement
@@ -77,13 +152,16 @@ class Tetris:
         self._calc_next_tile()
 
         # Check if next tile can be spawned, if it cannot game is over
-        if not self._is_legal_placement(Tetromino.PIECES[self.next_tile]["right"], self._spawn_point()):
+        if not self.can_spawn(self.next_tile):
             self.terminal_state = True
 
         reward = 2*cleared_rows*cleared_rows + (self.HEIGHT-(self.highest_tile+1))
         if self.terminal_state:
             reward += -10
 
+        if self.metrics is not None:
+            self.metrics.add_time("take_action", start)
+
         return reward, self.terminal_state
         
 
@@ -93,37 +171,404 @@ class Tetris:
 
         i.e. after placing the next tile at `point` with orientation `orientation`
         '''
-        board = self.get_state_copy()
         tetromino = Tetromino.PIECES[self.next_tile][orientation]
-        highest_placement = self._place_tetronimo(tetromino, point, board=board)
-        highest_tile = max(self.highest_tile, highest_placement)
-        
-        lines_cleared = self._clear_lines(board=board)
-        highest_tile -= lines_cleared
-        total_lines_cleared = self.total_lines_cleared + lines_cleared
 
-        # board = np.array(board).reshape(self.WIDTH*self.HEIGHT)
+        return self._afterstate_features(tetromino, point.x, point.y)
+
+    def can_spawn(self, tile):
+        '''
+        Whether `tile` can be spawned on the current board, if not the game is over
+        '''
+        return self._is_legal_placement(Tetromino.PIECES[tile]["right"], self._spawn_point())
+
+    def afterstates(self, tile=None):
+        '''
+        Returns (features, actions) for every placement of the next tile (or `tile`), filled in one pass
+
+        `features` is a float32 array of shape (n_actions, 4) holding `state_after_action` of each placement,
+        ready to be fed to the model. `actions` is an int32 array of shape (n_actions, 3) with rows of
+        (x, y, rotation), see `decode_action`
+
+        Both are views into buffers reused by the next call, copy anything that needs to outlive it
+        '''
+        tetromino = Tetromino.PIECES[self.next_tile if tile is None else tile]
+
+        if self.cache is not None:
+            if self.metrics is None:
+                return self._cached_afterstates(tetromino)
+
+            # the cache lookup and features of cached placements, a miss also times its search
+            start = clock()
+            result = self._cached_afterstates(tetromino)
+            self.metrics.add_time("cached_afterstates", start)
+            return result
+
+        end_states = self._placements(tetromino)
+        rotated = tetromino['rotations']
+        afterstate_features = self._afterstate_features
+
+        if self.metrics is not None:
+            start = clock()
+
+        features = self._afterstate_buffer[:len(end_states)]
+        actions = self._action_buffer[:len(end_states)]
+        if end_states:
+            features[:] = [afterstate_features(rotated[rotation], x, y) for x, y, rotation in end_states]
+            actions[:] = end_states
+
+        if self.metrics is not None:
+            self.metrics.add_time("features", start)
+
+        return features, actions
+
+    def board_state(self):
+        '''
+        The board observation: a uint8 array of shape (HEIGHT, WIDTH, 1) holding 1 for filled tiles, indexed [y, x]
+        '''
+        rows = np.array([self._row_mask(y) for y in range(self.HEIGHT)], dtype=np.int64)
+        return ((rows[:, None] >> self._column_shifts) & 1).astype(np.uint8)[:, :, None]
+
+    def board_afterstates(self, tile=None):
+        '''
+        Like `afterstates`, but the observation of each placement is the board after it and its line
+        clears, as a uint8 array of shape (n_actions, HEIGHT, WIDTH, 1) (see `board_state`)
+
+        Both arrays are views into buffers reused by the next call to this or `afterstates`
+        '''
+        tetromino = Tetromino.PIECES[self.next_tile if tile is None else tile]
+
+        if self.cache is not None:
+            end_states = self._cached_placements(tetromino)[0]
+        else:
+            end_states = self._placements(tetromino)
+
+        if self._board_buffer is None:
+            self._board_buffer = np.zeros((len(self._search_visited), self.HEIGHT, self.WIDTH, 1), dtype=np.uint8)
+            self._board_rows_buffer = np.zeros((len(self._search_visited), self.HEIGHT), dtype=np.int64)
+
+        if self.metrics is not None:
+            start = clock()
+
+        # place each tile on the row bitmasks of the board, then expand all of them to tiles at once
+        rows = [self._row_mask(y) for y in range(self.HEIGHT)]
+        full_row = (1 << self.WIDTH) - 1
+        board_rows = self._board_rows_buffer[:len(end_states)]
+        rotated = tetromino['rotations']
+
+        for i, (x, y, rotation) in enumerate(end_states):
+            after = rows.copy()
+            shift = x + rotated[rotation]['bounds'][0]
+            for dy, mask in rotated[rotation]['row_masks']:
+                after[y + dy] |= mask << shift
+
+            if any(after[y + dy] == full_row for dy, _ in rotated[rotation]['row_masks']):
+                after = [row for row in after if row != full_row]
+                after += [0] * (self.HEIGHT - len(after))
+
+            board_rows[i] = after
+
+        boards = self._board_buffer[:len(end_states)]
+        actions = self._action_buffer[:len(end_states)]
+        if end_states:
+            boards[:, :, :, 0] = (board_rows[:, :, None] >> self._column_shifts) & 1
+            actions[:] = end_states
+
+        if self.metrics is not None:
+            self.metrics.add_time("features", start)
+
+        return boards, actions
+
+    def _cached_placements(self, tetromino: Tetromino.Tetrominos):
+        '''
+        Returns the cache entry [end states, actions, afterstate features or None] of placing `tetromino`
+        on the current board, searching and storing it on a miss
+
+        The stored features hold the lines cleared by each placement instead of the total, as the total
+        isn't part of the board
+        '''
+        # the board size too, the same tiles hash alike on boards of any size sharing a cache
+        key = (self.WIDTH, self.HEIGHT, self._zobrist, self.highest_tile, tetromino['id'], self.full_search)
+        entry = self.cache.get(key)
+        if self.metrics is not None:
+            self.metrics.count("cache_misses" if entry is None else "cache_hits")
+        if entry is None:
+            end_states = self._placements(tetromino)
+            entry = [end_states, np.array(end_states, dtype=np.int32).reshape(-1, 3), None]
+            self.cache.put(key, entry)
+
+        return entry
+
+    def _cached_afterstates(self, tetromino: Tetromino.Tetrominos):
+        entry = self._cached_placements(tetromino)
+        end_states, cached_actions, cached_features = entry
+
+        features = self._afterstate_buffer[:len(end_states)]
+        actions = self._action_buffer[:len(end_states)]
+        actions[:] = cached_actions
+
+        if cached_features is None:
+            rotated = tetromino['rotations']
+            afterstate_features = self._afterstate_features
+            if end_states:
+                features[:] = [afterstate_features(rotated[rotation], x, y) for x, y, rotation in end_states]
+            entry[2] = features.copy()
+            entry[2][:, 1] -= self.total_lines_cleared
+        else:
+            features[:] = cached_features
+            features[:, 1] += self.total_lines_cleared
+
+        return features, actions
+
+    def decode_action(self, action):
+        '''
+        Converts a row of the `actions` array returned by `afterstates` into (point, orientation) for `take_action`
+        '''
+        x, y, rotation = action
+        return Point(int(x), int(y)), Tetromino.ORIENTATIONS[rotation]
+
+    def _afterstate_features(self, tetromino: Tetromino.RotatedTetromino, x: int, y: int):
+        cells = [(x + dx, y + dy) for dx, dy in tetromino['offsets']]
+
+        # Unless a line is cleared only the columns under the tetromino change, so the features
+        # follow from the tracked column state
+        if not self._completes_line(cells):
+            _, holes_delta, bumpiness_delta = self._placement_deltas(cells)
+            highest_placement = max(cell_y for _, cell_y in cells)
+            return [
+                max(self.highest_tile, highest_placement),
+                self.total_lines_cleared,
+                self._bumpiness + bumpiness_delta,
+                self._num_holes + holes_delta,
+            ]
+
+        # Otherwise evaluate the placement in place and restore the board afterwards
+        undo_log = self._push_cells(cells)
+        state = self.get_state()
+        self.pop_placement(undo_log)
+
+        return state
+
+    def push_placement(self, point: Point, orientation: str, tile=None):
+        '''
+        Speculatively place the next tile (or `tile`) at `point` with orientation `orientation` and clear
+        lines, on the board itself. Returns an undo log to hand to `pop_placement` which restores the
+        board and state exactly
+
+        Unlike `take_action` this doesn't draw a new tile, touch `latest_placement` or use the RNG
+        '''
+        tetromino = Tetromino.PIECES[self.next_tile if tile is None else tile][orientation]
+        return self._push_cells([(point.x + dx, point.y + dy) for dx, dy in tetromino['offsets']])
+
+    def _push_cells(self, cells):
+        saved_state = (
+            self._column_heights.copy(), self._column_filled.copy(), self._row_filled.copy(), self._row_zobrist.copy(),
+            self._num_holes, self._bumpiness, self._zobrist, self.highest_tile, self.total_lines_cleared,
+        )
+
+        self._set_tiles(cells, 1)
+        self._track_placement(cells)
+
+        cleared_rows = []
+        lines_cleared = self._clear_lines(cleared_rows=cleared_rows)
+        self.highest_tile = max(self.highest_tile, max(y for _, y in cells)) - lines_cleared
+        self.total_lines_cleared += lines_cleared
+
+        return cells, cleared_rows, saved_state
+
+    def pop_placement(self, undo_log):
+        '''
+        Undo a `push_placement`, placements must be popped in the reverse order they were pushed
+        '''
+        cells, cleared_rows, saved_state = undo_log
+
+        self._restore_lines(cleared_rows)
+        self._set_tiles(cells, 0)
 
-        return [highest_tile, total_lines_cleared, self._calc_bumpiness(board), self._calc_num_holes(board)]
+        (
+            self._column_heights, self._column_filled, self._row_filled, self._row_zobrist,
+            self._num_holes, self._bumpiness, self._zobrist, self.highest_tile, self.total_lines_cleared,
+        ) = saved_state
 
     def get_state(self):
-        # return np.array(self.board).reshape(self.WIDTH*self.HEIGHT) 
-        return [self.highest_tile, self.total_lines_cleared, self._calc_bumpiness(), self._calc_num_holes()]
+        return [self.highest_tile, self.total_lines_cleared, self._bumpiness, self._num_holes]
 
-    def reset_state(self):
-        self._random = random.Random()
+    def reset_state(self, seed=None):
+        '''
+        Start a new episode, with the piece generator seeded by `seed` (an integer in [0, 2**64)) or else
+        the next episode seed
+        '''
+        self.episode_seed = self._episode_seeds.getrandbits(64) if seed is None else seed
+        self._pieces = GENERATORS[self.generator](self.episode_seed)
 
         self.board = [[0 for _ in range(self.HEIGHT)] for _ in range(self.WIDTH)]
+        self._reset_column_state()
         self.terminal_state = False
         self.highest_tile = -1
         self.tiles_placed = 0
         self.total_lines_cleared = 0
+        self.latest_placement = []
+        self.preview = []
         self._calc_next_tile()
 
+        if self.record:
+            self.trace = GameTrace(self.WIDTH, self.HEIGHT, self.preview_size, self.episode_seed, self.generator)
+
     def get_state_copy(self):
         ## TODO: same as above
         return deepcopy(self.board)
 
+    def snapshot(self):
+        '''
+        Compact, picklable copy of the game position: (row bitmasks, highest_tile, total_lines_cleared,
+        next_tile, preview). Tile colours are not kept, see `load_snapshot`
+        '''
+        return (
+            tuple(self._row_mask(y) for y in range(self.HEIGHT)),
+            self.highest_tile, self.total_lines_cleared, self.next_tile, tuple(self.preview),
+        )
+
+    def load_snapshot(self, snapshot):
+        '''
+        Make the position the one of `snapshot`, taken from an engine of the same size
+        '''
+        rows, self.highest_tile, self.total_lines_cleared, self.next_tile, preview = snapshot
+        self.preview = list(preview)
+        self.latest_placement = []
+        self._set_rows(rows)
+        self._reset_column_state()
+        self.terminal_state = not self.can_spawn(self.next_tile)
+
+    def _set_rows(self, rows):
+        self.board = [[(row >> x) & 1 for row in rows] for x in range(self.WIDTH)]
+
+    def _reset_column_state(self):
+        '''
+        Recompute the tracked column state from the board
+
+        `_column_heights` is the y of the highest tile in each column + 1 (0 if the column is empty),
+        `_column_filled` / `_row_filled` count the filled tiles of each column / row. The holes in a
+        column are then `height - filled`. `_row_zobrist` is the Zobrist hash of each row and `_zobrist`
+        that of the whole board
+        '''
+        board = self.board
+        self._column_heights = [0 if top is None else top + 1 for top in self._calc_column_tops(board)]
+        self._column_filled = [sum(1 for tile in col if tile != 0) for col in board]
+        self._row_filled = [sum(1 for col in board if col[y] != 0) for y in range(self.HEIGHT)]
+        self._row_zobrist = [self._hash_row(y) for y in range(self.HEIGHT)]
+        self._refresh_feature_totals()
+
+    def _row_mask(self, y):
+        '''
+        Bitmask of the filled tiles in row `y`, bit x set if (x, y) is filled
+        '''
+        mask = 0
+        for x, col in enumerate(self.board):
+            if col[y] != 0:
+                mask |= 1 << x
+        return mask
+
+    def _hash_row(self, y):
+        row_hash = 0
+        mask = self._row_mask(y)
+        keys = self._zobrist_keys
+        while mask:
+            lowest = mask & -mask
+            row_hash ^= keys[lowest.bit_length()-1][y]
+            mask ^= lowest
+        return row_hash
+
+    def _refresh_feature_totals(self):
+        heights = self._column_heights
+        self._num_holes = sum(heights) - sum(self._column_filled)
+        self._bumpiness = sum(_bumpiness_term(heights[x-1], heights[x]) for x in range(1, self.WIDTH))
+
+        self._zobrist = 0
+        for row_hash in self._row_zobrist:
+            self._zobrist ^= row_hash
+
+    def _completes_line(self, cells):
+        '''
+        Whether placing tiles at `cells` would fill a row
+        '''
+        row_filled = self._row_filled
+        added: dict[int, int] = {}
+        for _, y in cells:
+            added[y] = added.get(y, 0) + 1
+            if row_filled[y] + added[y] == self.WIDTH:
+                return True
+        return False
+
+    def _placement_deltas(self, cells):
+        '''
+        Returns (heights of the changed columns, change in holes, change in bumpiness) for placing
+        tiles at `cells`, assuming no line is cleared. Neither the board nor the tracked state is touched
+        '''
+        heights = self._column_heights
+
+        new_heights: dict[int, int] = {}
+        for x, y in cells:
+            if y >= new_heights.get(x, heights[x]):
+                new_heights[x] = y + 1
+
+        # every placed tile fills a cell below the new column height, any other cell it uncovers is a hole
+        holes_delta = -len(cells)
+        for x, height in new_heights.items():
+            holes_delta += height - heights[x]
+
+        bumpiness_delta = 0
+        for x in {x for col in new_heights for x in (col, col + 1) if 0 < x < self.WIDTH}:
+            bumpiness_delta += _bumpiness_term(new_heights.get(x-1, heights[x-1]), new_heights.get(x, heights[x]))
+            bumpiness_delta -= _bumpiness_term(heights[x-1], heights[x])
+
+        return new_heights, holes_delta, bumpiness_delta
+
+    def _track_placement(self, cells):
+        new_heights, holes_delta, bumpiness_delta = self._placement_deltas(cells)
+
+        keys = self._zobrist_keys
+        for x, y in cells:
+            self._column_filled[x] += 1
+            self._row_filled[y] += 1
+            self._row_zobrist[y] ^= keys[x][y]
+            self._zobrist ^= keys[x][y]
+        for x, height in new_heights.items():
+            self._column_heights[x] = height
+
+        self._num_holes += holes_delta
+        self._bumpiness += bumpiness_delta
+
+    def _track_clear(self, cleared_rows, board):
+        '''
+        Update the tracked column state after `cleared_rows` have been removed from `board`
+        '''
+        for y in sorted(cleared_rows, reverse=True):
+            del self._row_filled[y]
+        self._row_filled.extend([0] * len(cleared_rows))
+
+        # rows above the lowest cleared one moved down, rehash them (and only them)
+        for y in range(min(cleared_rows), self.HEIGHT):
+            self._row_zobrist[y] = self._hash_row(y) if self._row_filled[y] else 0
+
+        # every cleared row had a tile in each column
+        self._column_filled = [filled - len(cleared_rows) for filled in self._column_filled]
+        self._column_heights = [0 if top is None else top + 1 for top in self._calc_column_tops(board)]
+        self._refresh_feature_totals()
+
+    def _calc_column_tops(self, board):
+        '''
+        Returns the y of the highest filled tile of each column, `None` for empty columns
+        '''
+        col_tops = []
+        for col in board:
+            top = None
+            for y in range(self.HEIGHT-1, -1, -1):
+                if col[y] != 0:
+                    top = y
+                    break
+            col_tops.append(top)
+
+        return col_tops
+
     def _calc_num_holes(self, board=None):
         if board is None:
             board = self.board
@@ -160,8 +605,13 @@ class Tetris:
 
         return bumpiness
                 
-    def _clear_lines(self, board = None) -> None:
-        if board == None:
+    def _clear_lines(self, board = None, cleared_rows = None) -> None:
+        '''
+        Remove filled rows from `board`, if `cleared_rows` is given the removed rows are appended to it
+        as (y, row) so `_restore_lines` can put them back
+        '''
+        tracked = board is None
+        if tracked:
             board = self.board
 
         filled_rows = []
@@ -177,19 +627,44 @@ class Tetris:
                 filled_rows.insert(0, y)
 
 
+        if cleared_rows is not None:
+            for y in filled_rows:
+                cleared_rows.append((y, [col[y] for col in board]))
+
         for col in board:
             for y in filled_rows:
                 del col[y]
                 col.append(0)
 
+        if tracked and filled_rows:
+            self._track_clear(filled_rows, board)
+
         # Return number of lines cleared
         return len(filled_rows) 
 
+    def _restore_lines(self, cleared_rows):
+        '''
+        Put back rows removed by `_clear_lines`, without updating the tracked column state
+        '''
+        for y, row in reversed(cleared_rows):
+            for col, tile in zip(self.board, row):
+                col.pop()
+                col.insert(y, tile)
+
+    def _set_tiles(self, cells, value):
+        '''
+        Write `value` to every (x, y) in `cells`, without updating the tracked column state
+        '''
+        board = self.board
+        for x, y in cells:
+            board[x][y] = value
+
     def _place_tetronimo(self, tetromino: Tetromino.RotatedTetromino, point: Point, COLOR=None, board=None):
-        if board == None:
+        tracked = board is None
+        if tracked:
             board = self.board
         if COLOR == None:
-            COLOR = random.randint(1, len(TETRIS_COLORS)-2) # -1 and 0 are black and white
+            COLOR = 1 + self.tiles_placed % (len(TETRIS_COLORS)-2) # -1 and 0 are black and white
 
         highest_tile = -1
         self.latest_placement = []
@@ -202,24 +677,41 @@ class Tetris:
             if tile_pos.y > highest_tile:
                 highest_tile = tile_pos.y
 
+        if tracked:
+            self._track_placement(self.latest_placement)
+
         return highest_tile
 
     def _remove_tetronimo(self, tetromino: Tetromino.RotatedTetromino, point: Point, board=None):
-        if board == None:
+        tracked = board is None
+        if tracked:
             board = self.board
 
         for tile_offest in tetromino['points']:
             tile_pos = point + tile_offest
             board[tile_pos.x][tile_pos.y] = 0
 
+        if tracked:
+            self._reset_column_state()
+
     def _is_legal_placement(self, tetromino: Tetromino.RotatedTetromino, point: Point):
         """
         Checks that placing a tetronimo exactly at `point` doesn't either go out-of-bounds
         or intersect with a tile on the board 
         """
-        for tile_offset in tetromino['points']:
-            tile_pos = point + tile_offset
-            if self._is_out_of_bounds(tile_pos) or self.board[tile_pos.x][tile_pos.y] != 0:
+        return self._fits(tetromino, point.x, point.y)
+
+    def _fits(self, tetromino: Tetromino.RotatedTetromino, x: int, y: int):
+        '''
+        `_is_legal_placement` on integer coordinates
+        '''
+        min_x, max_x, min_y, max_y = tetromino['bounds']
+        if x + min_x < 0 or x + max_x >= self.WIDTH or y + min_y < 0 or y + max_y >= self.HEIGHT:
+            return False
+
+        board = self.board
+        for dx, dy in tetromino['offsets']:
+            if board[x + dx][y + dy] != 0:
                 return False
         return True
 
@@ -230,64 +722,141 @@ class Tetris:
         return True
 
 
+    def _placements(self, tetromino: Tetromino.Tetrominos) -> list[tuple[int, int, int]]:
+        '''
+        End states (x, y, rotation) of every placement of `tetromino` from the spawn point
+
+        Without holes nothing can be tucked under an overhang, so every placement is a rotation + shift
+        + hard drop and `_drop_search` finds the same end states as `_search`. That needs room above
+        the stack to rotate and shift freely, otherwise (or with `full_search`) fall back to the search
+        '''
+        metrics = self.metrics
+        if metrics is not None:
+            start = clock()
+
+        spawn = self._spawn_point()
+        if (
+            not self.full_search and self._num_holes == 0
+            and spawn.y + Tetromino.MAX_Y_OFFSET < self.HEIGHT
+            and self._fits(tetromino['right'], spawn.x, spawn.y)
+        ):
+            end_states = self._drop_search(tetromino, "right")
+            if metrics is not None:
+                metrics.add_time("drop_search", start)
+        else:
+            end_states = self._search(tetromino, spawn, "right")
+            if metrics is not None:
+                metrics.add_time("search", start)
+                metrics.count("search_nodes", self._search_nodes)
+
+        return end_states
+
+    def _drop_search(self, tetromino: Tetromino.Tetrominos, starting_orientation: str) -> list[tuple[int, int, int]]:
+        '''
+        End states (x, y, rotation) of hard dropping `tetromino` in every reachable rotation and column
+
+        The landing y of each column follows from the column heights and the lowest tile of the
+        tetromino in each column, O(rotations x WIDTH)
+        '''
+        heights = self._column_heights
+        end_states = []
+
+        for rotation in tetromino['reachable_rotations'][Tetromino.ORIENTATIONS.index(starting_orientation)]:
+            rotated = tetromino['rotations'][rotation]
+            min_x, max_x, _, _ = rotated['bounds']
+            bottom_offsets = rotated['bottom_offsets']
+
+            for x in range(-min_x, self.WIDTH - max_x):
+                y = max(heights[x + dx] - dy for dx, dy in bottom_offsets)
+                end_states.append((x, y, rotation))
+
+        return end_states
+
     def _bfs(self, tetromino: Tetromino.Tetrominos, point: Point, starting_orientation: str) -> list[tuple[Point, str]]:
         '''
         breadth-first search of all possible placements for a `tetromino`
 
         returns a list of tuples of shape: (tetromino_position: `Point`, tetromino_orientation: `str`)
         '''
-        visited = []
-        queue = []
-        end_states: list[tuple[Point, str]] = []
+        return [
+            (Point(x, y), Tetromino.ORIENTATIONS[rotation])
+            for x, y, rotation in self._search(tetromino, point, starting_orientation)
+        ]
+
+    def _search(self, tetromino: Tetromino.Tetrominos, point: Point, starting_orientation: str) -> list[tuple[int, int, int]]:
+        '''
+        `_bfs` returning end states as (x, y, rotation) where rotation indexes `Tetromino.ORIENTATIONS`
 
-        visited.append((point, starting_orientation))
-        queue.append((point, starting_orientation))
+        States are encoded as `((x + offset) * stride + (y + offset)) * 4 + rotation` and marked in a visited
+        list stamped with the id of the search, so nothing is allocated per state
+        '''
+        orientations = Tetromino.ORIENTATIONS
+        num_orientations = len(orientations)
+        offset = self._search_offset
+        stride = self._search_stride
+        step_x = stride * num_orientations
+
+        rotated = tetromino['rotations']
+        next_rotations = tetromino['next_rotations']
+
+        self._search_id += 1
+        search_id = self._search_id
+        visited = self._search_visited
+        fits = self._fits
+
+        end_states: list[tuple[int, int, int]] = []
+
+        start = ((point.x + offset) * stride + point.y + offset) * num_orientations + orientations.index(starting_orientation)
+        visited[start] = search_id
+        queue = [start]
+        expanded = 0
         while len(queue) != 0:
-            curr_point, curr_orientation = queue.pop()
+            state = queue.pop()
+            expanded += 1
+            rotation = state % num_orientations
+            cell = state // num_orientations
+            x = cell // stride - offset
+            y = cell % stride - offset
+            curr_rotated = rotated[rotation]
 
             # If we cannot legally move down, then there must be something below us
             # i.e we are at an end state
-            if not self._is_legal_placement(tetromino[curr_orientation], curr_point + Point(0, -1)):
-                end_states.append((curr_point, curr_orientation))
-
-            next_orientations = self._get_rotations(curr_orientation, tetromino)
+            if not fits(curr_rotated, x, y-1):
+                end_states.append((x, y, rotation))
 
             # Iterate over all possible next moves for tetronimo, e.g: (move left, move right, move down, rotate)
-            for next_point, next_orientation in [
-                (curr_point+Point(1, 0), curr_orientation),
-                (curr_point+Point(-1, 0), curr_orientation),
-                (curr_point+Point(0, -1), curr_orientation),
-            ] + [(curr_point, next_orientation) for next_orientation in next_orientations]:
-                if self._is_legal_placement(tetromino[next_orientation], next_point):
-                    if (next_point, next_orientation) not in visited:
-                        visited.append((next_point, next_orientation))
-                        queue.append((next_point, next_orientation))
-
+            for next_state, next_x, next_y, next_rotation in (
+                (state + step_x, x+1, y, rotation),
+                (state - step_x, x-1, y, rotation),
+                (state - num_orientations, x, y-1, rotation),
+            ):
+                if visited[next_state] != search_id and fits(curr_rotated, next_x, next_y):
+                    visited[next_state] = search_id
+                    queue.append(next_state)
+
+            for next_rotation in next_rotations[rotation]:
+                next_state = state - rotation + next_rotation
+                if visited[next_state] != search_id and fits(rotated[next_rotation], x, y):
+                    visited[next_state] = search_id
+                    queue.append(next_state)
+
+        self._search_nodes = expanded
         return end_states
             
 
     def _get_rotations(self, current_orientation, tetromino: Tetromino.Tetrominos):
-        if tetromino["num_rotations"] == 1:
-            return [current_orientation]
-
-        if tetromino["num_rotations"] == 2:
-            if current_orientation == "up":
-                return ["right"]
-            if current_orientation == "right":
-                return ["up"]
-
-        if tetromino["num_rotations"] == 4:
-            if current_orientation == "up":
-                return ["right", "left"]
-            if current_orientation == "right":
-                return ["up", "down"]
-            if current_orientation == "down":
-                return ["right", "left"]
-            if current_orientation == "left":
-                return ["up", "down"]
+        return [
+            Tetromino.ORIENTATIONS[rotation]
+            for rotation in tetromino['next_rotations'][Tetromino.ORIENTATIONS.index(current_orientation)]
+        ]
         
     def _calc_next_tile(self):
-        self.next_tile = self._random.choice(Tetromino.PIECES_NAMES)
+        '''
+        Advance `next_tile` to the first tile of the `preview` queue, which is kept `preview_size` long
+        '''
+        while len(self.preview) <= self.preview_size:
+            self.preview.append(next(self._pieces))
+        self.next_tile = self.preview.pop(0)
 
     def _spawn_point(self):
         '''
@@ -1,9 +1,16 @@
 from Point import Point 
 from typing import TypedDict
+import numpy as np
 
 class RotatedTetromino(TypedDict):
     bottom_points: list[Point]
     points: list[Point]
+    # filled by _compile_rotation()
+    offsets: tuple[tuple[int, int], ...]
+    bottom_offsets: tuple[tuple[int, int], ...]
+    row_masks: list[tuple[int, int]]
+    bounds: tuple[int, int, int, int]
+    width: int
     
 
 class Tetrominos(TypedDict):
@@ -12,6 +19,11 @@ class Tetrominos(TypedDict):
     left: RotatedTetromino
     down: RotatedTetromino
     num_rotations: int
+    # filled by _compile_tetromino()
+    id: int
+    rotations: list[RotatedTetromino]
+    next_rotations: list[list[int]]
+    reachable_rotations: list[list[int]]
 
 PIECES: dict[str, Tetrominos] = {
     "O": {
@@ -261,4 +273,103 @@ PIECES: dict[str, Tetrominos] = {
     },
 }
 
-PIECES_NAMES = list(PIECES.keys())
\ No newline at end of file
+PIECES_NAMES = list(PIECES.keys())
+
+
+ORIENTATIONS = ("up", "right", "down", "left")
+
+def _compile_rotation(rotated: RotatedTetromino) -> None:
+    '''
+    Precompute the integer forms of a rotated tetromino used by the engine hot paths
+
+    `offsets` are the points as (x, y) tuples, `bottom_points` / `bottom_offsets` the lowest point of
+    each column the tetromino covers, `row_masks` is a list of (y offset, mask) where bit i of mask is
+    set if the tile at x offset `min_x + i` is filled, `bounds` is (min_x, max_x, min_y, max_y)
+    '''
+    min_x = min(point.x for point in rotated['points'])
+    max_x = max(point.x for point in rotated['points'])
+    min_y = min(point.y for point in rotated['points'])
+    max_y = max(point.y for point in rotated['points'])
+
+    masks: dict[int, int] = {}
+    bottoms: dict[int, int] = {}
+    for point in rotated['points']:
+        masks[point.y] = masks.get(point.y, 0) | (1 << (point.x - min_x))
+        bottoms[point.x] = min(bottoms.get(point.x, point.y), point.y)
+
+    rotated['offsets'] = tuple((point.x, point.y) for point in rotated['points'])
+    rotated['bottom_points'] = [Point(x, y) for x, y in sorted(bottoms.items())]
+    rotated['bottom_offsets'] = tuple(sorted(bottoms.items()))
+    rotated['row_masks'] = sorted(masks.items())
+    rotated['bounds'] = (min_x, max_x, min_y, max_y)
+    rotated['width'] = max_x - min_x + 1
+
+def _rotations_from(orientation: str, num_rotations: int) -> list[str]:
+    '''
+    Orientations reachable with one rotation from `orientation`
+    '''
+    if num_rotations == 1:
+        return [orientation]
+
+    if num_rotations == 2:
+        if orientation == "up":
+            return ["right"]
+        if orientation == "right":
+            return ["up"]
+        # the other two orientations duplicate these and are never reached
+        return []
+
+    if orientation in ("up", "down"):
+        return ["right", "left"]
+    return ["up", "down"]
+
+def _compile_tetromino(tetromino: Tetrominos, piece_id: int) -> None:
+    for orientation in ORIENTATIONS:
+        _compile_rotation(tetromino[orientation])
+
+    tetromino['id'] = piece_id
+    tetromino['rotations'] = [tetromino[orientation] for orientation in ORIENTATIONS]
+    tetromino['next_rotations'] = [
+        [ORIENTATIONS.index(next_orientation) for next_orientation in _rotations_from(orientation, tetromino['num_rotations'])]
+        for orientation in ORIENTATIONS
+    ]
+
+    # rotations reachable from each rotation by rotating any number of times
+    tetromino['reachable_rotations'] = []
+    for rotation in range(len(ORIENTATIONS)):
+        reachable = [rotation]
+        for current in reachable:
+            reachable += [next_rotation for next_rotation in tetromino['next_rotations'][current] if next_rotation not in reachable]
+        tetromino['reachable_rotations'].append(sorted(reachable))
+
+for piece_id, name in enumerate(PIECES_NAMES):
+    _compile_tetromino(PIECES[name], piece_id)
+
+### Compiled piece table, indexed by piece id (position in PIECES_NAMES) and rotation id (position in ORIENTATIONS)
+
+PIECE_IDS = {name: piece_id for piece_id, name in enumerate(PIECES_NAMES)}
+PIECE_TABLE: list[Tetrominos] = [PIECES[name] for name in PIECES_NAMES]
+
+# (piece, rotation, tile, xy) offsets of every tile from the anchor point
+OFFSETS = np.array([[rotated['offsets'] for rotated in tetromino['rotations']] for tetromino in PIECE_TABLE], dtype=np.int8)
+# (piece, rotation) -> (min_x, max_x, min_y, max_y)
+BOUNDS = np.array([[rotated['bounds'] for rotated in tetromino['rotations']] for tetromino in PIECE_TABLE], dtype=np.int8)
+# (piece, rotation) -> number of columns covered
+WIDTHS = np.array([[rotated['width'] for rotated in tetromino['rotations']] for tetromino in PIECE_TABLE], dtype=np.int8)
+# (piece, rotation, column) -> y offset of the lowest tile in column `min_x + column`, -1 past the width
+COLUMN_BOTTOMS = np.full((len(PIECE_TABLE), len(ORIENTATIONS), 4), -1, dtype=np.int8)
+# (piece, rotation, i) -> rotations reachable with one rotation, -1 padded
+NEXT_ROTATIONS = np.full((len(PIECE_TABLE), len(ORIENTATIONS), 2), -1, dtype=np.int8)
+
+for tetromino in PIECE_TABLE:
+    for rotation, rotated in enumerate(tetromino['rotations']):
+        for column, (_, dy) in enumerate(rotated['bottom_offsets']):
+            COLUMN_BOTTOMS[tetromino['id'], rotation, column] = dy
+        for i, next_rotation in enumerate(tetromino['next_rotations'][rotation]):
+            NEXT_ROTATIONS[tetromino['id'], rotation, i] = next_rotation
+
+# Largest y offset of a tile from its anchor point
+MAX_Y_OFFSET = int(BOUNDS[:, :, 3].max())
+
+# Largest distance an anchor point can sit left of / below the tiles it places
+ANCHOR_PADDING = int(max(BOUNDS[:, :, 0].max(), BOUNDS[:, :, 2].max()))
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+class TranspositionCache:
+    '''
+    Bounded LRU cache of placement search results, shared between games and Tetris instances
+
+    Keys are built by `Tetris` from the board size, the Zobrist hash of the board and the tetromino being placed,
+    values hold the end states and afterstate features of that position
+    '''
+
+    def __init__(self, maxsize=65536) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        '''
+        Returns the value stored for `key` and marks it as most recently used, `None` if there is none
+        '''
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
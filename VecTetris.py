@@ -0,0 +1,103 @@
+import numpy as np
+
+from BitboardTetris import BitboardTetris
+
+class VecTetris:
+    '''
+    Steps `num_envs` independent Tetris games together
+
+    `afterstates()` concatenates the placements of every game into one batch so a single forward
+    pass of the model scores all of them, `step()` takes one placement per game and resets games
+    that ended. The placement search itself stays per board, each game is a bitboard engine
+    '''
+
+    def __init__(self, num_envs, width, height, seed=None, engine=BitboardTetris, generator="uniform") -> None:
+        self.num_envs = num_envs
+        self.WIDTH = width
+        self.HEIGHT = height
+
+        self.envs = [engine(width, height, None if seed is None else seed + i, generator=generator) for i in range(num_envs)]
+
+        max_actions = len(self.envs[0]._afterstate_buffer)
+        self._feature_buffer = np.zeros((num_envs * max_actions, 4), dtype=np.float32)
+        self._action_buffer = np.zeros((num_envs * max_actions, 3), dtype=np.int32)
+        self.offsets = np.zeros(num_envs + 1, dtype=np.int64)
+
+        self.episode_rewards = np.zeros(num_envs, dtype=np.float64)
+        self.episode_steps = np.zeros(num_envs, dtype=np.int64)
+
+        # (reward, steps, lines cleared) of every game finished since the last call to pop_finished()
+        self.finished: list[tuple[float, int, int]] = []
+
+    def reset_state(self):
+        for env in self.envs:
+            env.reset_state()
+        self.episode_rewards[:] = 0
+        self.episode_steps[:] = 0
+        self.finished = []
+
+    def get_states(self):
+        '''
+        Returns the current state of every game as a float32 array of shape (num_envs, 4)
+        '''
+        return np.array([env.get_state() for env in self.envs], dtype=np.float32)
+
+    def afterstates(self):
+        '''
+        Returns (features, actions) of every placement of every game in one batch
+
+        The placements of game i are rows `offsets[i]:offsets[i+1]`, see `Tetris.afterstates` for the
+        layout of the rows. Both are views into buffers reused by the next call
+        '''
+        offset = 0
+        for i, env in enumerate(self.envs):
+            features, actions = env.afterstates()
+            n = len(actions)
+            self._feature_buffer[offset:offset+n] = features
+            self._action_buffer[offset:offset+n] = actions
+            self.offsets[i] = offset
+            offset += n
+        self.offsets[self.num_envs] = offset
+
+        return self._feature_buffer[:offset], self._action_buffer[:offset]
+
+    def argmax_per_env(self, values):
+        '''
+        Index of the highest of `values` within each game's placements, `values` is one value per afterstate row
+        '''
+        values = np.asarray(values).reshape(-1)
+        return np.array([
+            np.argmax(values[self.offsets[i]:self.offsets[i+1]]) for i in range(self.num_envs)
+        ], dtype=np.int64)
+
+    def step(self, action_indices):
+        '''
+        Take placement `action_indices[i]` (relative to game i's placements from the last `afterstates`
+        call) in every game. Games that end are reset straight away
+
+        returns (rewards, dones) as arrays of shape (num_envs,)
+        '''
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+
+        for i, env in enumerate(self.envs):
+            action = self._action_buffer[self.offsets[i] + action_indices[i]]
+            point, orientation = env.decode_action(action)
+            rewards[i], dones[i] = env.take_action(point, orientation)
+
+            self.episode_rewards[i] += rewards[i]
+            self.episode_steps[i] += 1
+            if dones[i]:
+                self.finished.append((float(self.episode_rewards[i]), int(self.episode_steps[i]), env.total_lines_cleared))
+                self.episode_rewards[i] = 0
+                self.episode_steps[i] = 0
+                env.reset_state()
+
+        return rewards, dones
+
+    def pop_finished(self):
+        '''
+        Returns and clears the (reward, steps, lines cleared) of games finished since the last call
+        '''
+        finished, self.finished = self.finished, []
+        return finished
@@ -0,0 +1,43 @@
+'''
+The hard drop placements of `_drop_search` must match the full `_search` (what `_bfs` returns) on every
+board without holes, since `_placements` takes the drop path on those boards
+'''
+import random
+
+import pytest
+
+from Tetris import Tetris
+from BitboardTetris import BitboardTetris
+import Tetromino
+
+@pytest.mark.parametrize("engine", [Tetris, BitboardTetris])
+@pytest.mark.parametrize("width, height", [(10, 18), (6, 12)])
+def test_drop_search_matches_search_without_holes(engine, width, height):
+    tetris = engine(width, height, seed=0)
+    tetris.reset_state()
+    policy = random.Random(0)
+    compared = 0
+
+    for _ in range(1500):
+        tetromino = Tetromino.PIECES[tetris.next_tile]
+        spawn = tetris._spawn_point()
+        searched = set(tetris._search(tetromino, spawn, "right"))
+
+        # the drop path also needs room above the stack to rotate and shift, as in _placements
+        if tetris._num_holes == 0 and spawn.y + Tetromino.MAX_Y_OFFSET < height:
+            assert set(tetris._drop_search(tetromino, "right")) == searched
+            compared += 1
+        assert set(tetris._placements(tetromino)) == searched
+
+        # mostly play the lowest placement so hole-free boards are common
+        actions = tetris.get_actions()
+        if policy.random() < 0.8:
+            action = min(actions, key=lambda action: action[0].y + 3 * policy.random())
+        else:
+            action = policy.choice(actions)
+
+        _, done = tetris.take_action(*action)
+        if done:
+            tetris.reset_state()
+
+    assert compared > 50